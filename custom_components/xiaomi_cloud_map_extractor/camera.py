@@ -1,14 +1,22 @@
+import asyncio
+import hashlib
 import io
 import logging
 import time
 from datetime import timedelta
 from enum import Enum
+from functools import partial
 from typing import Any, Dict, List, Optional
 
 from custom_components.xiaomi_cloud_map_extractor.common.backoff import Backoff
+from custom_components.xiaomi_cloud_map_extractor.common.image_encoder import ImageEncoder
 from custom_components.xiaomi_cloud_map_extractor.common.map_data import MapData
+from custom_components.xiaomi_cloud_map_extractor.common.poll_scheduler import PollScheduler
+from custom_components.xiaomi_cloud_map_extractor.common.render_cache import RenderCache
+from custom_components.xiaomi_cloud_map_extractor.common.render_pipeline import RenderPipeline
 from custom_components.xiaomi_cloud_map_extractor.common.vacuum import XiaomiCloudVacuum
-from custom_components.xiaomi_cloud_map_extractor.types import Colors, Drawables, ImageConfig, Sizes, Texts
+from custom_components.xiaomi_cloud_map_extractor.types import Colors, Drawables, ImageConfig, OutputConfig, Sizes, \
+    Texts
 
 try:
     from miio import RoborockVacuum, DeviceException
@@ -21,11 +29,14 @@ from homeassistant.components.camera import Camera, CameraEntityFeature, ENTITY_
 
 from homeassistant.const import CONF_ENTITY_ID, CONF_HOST, CONF_NAME, CONF_PASSWORD, CONF_TOKEN, CONF_USERNAME
 from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
 from homeassistant.helpers.entity import generate_entity_id
 from homeassistant.helpers.reload import async_setup_reload_service
+from homeassistant.helpers.storage import Store
 
 from custom_components.xiaomi_cloud_map_extractor.common.map_data_parser import MapDataParser
-from custom_components.xiaomi_cloud_map_extractor.common.xiaomi_cloud_connector import XiaomiCloudConnector
+from custom_components.xiaomi_cloud_map_extractor.common.xiaomi_cloud_connector_async import \
+    XiaomiCloudConnectorAsync
 from custom_components.xiaomi_cloud_map_extractor.const import *
 from custom_components.xiaomi_cloud_map_extractor.dreame.vacuum import DreameVacuum
 from custom_components.xiaomi_cloud_map_extractor.roidmi.vacuum import RoidmiVacuum
@@ -37,6 +48,16 @@ from custom_components.xiaomi_cloud_map_extractor.ijai.vacuum import IjaiVacuum
 _LOGGER = logging.getLogger(__name__)
 
 SCAN_INTERVAL = timedelta(seconds=5)
+DEFAULT_IDLE_SCAN_INTERVAL = timedelta(seconds=60)
+IDLE_VACUUM_STATE_INTERVAL = timedelta(seconds=30)
+
+STORAGE_VERSION = 1
+MAX_FAILED_MAP_RETRIEVALS = 3
+MAX_ERROR_BACKOFF = timedelta(minutes=5)
+MAP_NAME_RETRIEVAL_TIMEOUT = timedelta(seconds=60)
+MAX_RESIZED_IMAGES = 8
+# cleaning, returning home, manual mode, spot cleaning, docking, going to target, zoned and segment cleaning
+ACTIVE_VACUUM_STATE_CODES = [5, 6, 7, 11, 15, 16, 17, 18]
 
 DEFAULT_TRIMS = {
     CONF_LEFT: 0,
@@ -45,6 +66,14 @@ DEFAULT_TRIMS = {
     CONF_BOTTOM: 0
 }
 
+DEFAULT_IMAGE_OUTPUT = {
+    CONF_FORMAT: CONF_AVAILABLE_FORMAT_PNG,
+    CONF_COMPRESS_LEVEL: 6,
+    CONF_QUANTIZE: False,
+    CONF_LOSSLESS: True,
+    CONF_QUALITY: 80
+}
+
 DEFAULT_SIZES = {
     CONF_SIZE_VACUUM_RADIUS: 6,
     CONF_SIZE_PATH_WIDTH: 1,
@@ -73,6 +102,9 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
         vol.Optional(CONF_COUNTRY, default=None): vol.Or(vol.In(CONF_AVAILABLE_COUNTRIES), vol.Equal(None)),
         vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
         vol.Optional(CONF_AUTO_UPDATE, default=True): cv.boolean,
+        vol.Optional(CONF_IDLE_SCAN_INTERVAL, default=DEFAULT_IDLE_SCAN_INTERVAL): cv.time_period,
+        vol.Optional(CONF_RENDER_BACKEND, default=CONF_AVAILABLE_RENDER_BACKEND_THREAD):
+            vol.In(CONF_AVAILABLE_RENDER_BACKENDS),
         vol.Optional(CONF_COLORS, default={}): vol.Schema({
             vol.In(CONF_AVAILABLE_COLORS): COLOR_SCHEMA
         }),
@@ -91,6 +123,15 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
                     vol.Optional(CONF_BOTTOM, default=0): PERCENT_SCHEMA
                 }),
             }),
+        vol.Optional(CONF_IMAGE_OUTPUT, default=DEFAULT_IMAGE_OUTPUT): vol.Schema({
+            vol.Optional(CONF_FORMAT, default=DEFAULT_IMAGE_OUTPUT[CONF_FORMAT]): vol.In(CONF_AVAILABLE_FORMATS),
+            vol.Optional(CONF_COMPRESS_LEVEL, default=DEFAULT_IMAGE_OUTPUT[CONF_COMPRESS_LEVEL]):
+                vol.All(vol.Coerce(int), vol.Range(min=0, max=9)),
+            vol.Optional(CONF_QUANTIZE, default=DEFAULT_IMAGE_OUTPUT[CONF_QUANTIZE]): cv.boolean,
+            vol.Optional(CONF_LOSSLESS, default=DEFAULT_IMAGE_OUTPUT[CONF_LOSSLESS]): cv.boolean,
+            vol.Optional(CONF_QUALITY, default=DEFAULT_IMAGE_OUTPUT[CONF_QUALITY]):
+                vol.All(vol.Coerce(int), vol.Range(min=1, max=100))
+        }),
         vol.Optional(CONF_ATTRIBUTES, default=[]): vol.All(cv.ensure_list, [vol.In(CONF_AVAILABLE_ATTRIBUTES)]),
         vol.Optional(CONF_TEXTS, default=[]):
             vol.All(cv.ensure_list, [vol.Schema({
@@ -171,6 +212,9 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     country = config[CONF_COUNTRY]
     name = config[CONF_NAME]
     should_poll = config[CONF_AUTO_UPDATE]
+    idle_scan_interval = config[CONF_IDLE_SCAN_INTERVAL]
+    image_output = config[CONF_IMAGE_OUTPUT]
+    render_backend = config[CONF_RENDER_BACKEND]
     image_config = config[CONF_MAP_TRANSFORM]
     colors = config[CONF_COLORS]
     room_colors = config[CONF_ROOM_COLORS]
@@ -189,7 +233,8 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     entity_id = generate_entity_id(ENTITY_ID_FORMAT, name, hass=hass)
     async_add_entities([VacuumCamera(entity_id, host, token, username, password, country, name, should_poll,
                                      image_config, colors, drawables, sizes, texts, attributes, store_map_raw,
-                                     store_map_image, store_map_path, force_api)])
+                                     store_map_image, store_map_path, force_api, idle_scan_interval,
+                                     image_output, render_backend)])
 
 
 class VacuumCamera(Camera):
@@ -198,12 +243,18 @@ class VacuumCamera(Camera):
     def __init__(self, entity_id: str, host: str, token: str, username: str, password: str, country: str, name: str,
                  should_poll: bool, image_config: ImageConfig, colors: Colors, drawables: Drawables, sizes: Sizes,
                  texts: Texts, attributes: List[str], store_map_raw: bool, store_map_image: bool, store_map_path: str,
-                 force_api: str):
+                 force_api: str, idle_scan_interval: timedelta = DEFAULT_IDLE_SCAN_INTERVAL,
+                 image_output: OutputConfig = DEFAULT_IMAGE_OUTPUT,
+                 render_backend: str = CONF_AVAILABLE_RENDER_BACKEND_THREAD):
         super().__init__()
         self.entity_id = entity_id
-        self.content_type = CONTENT_TYPE
+        self._encoder = ImageEncoder(image_output)
+        self.content_type = self._encoder.content_type
+        self._renderer = None
+        if render_backend == CONF_AVAILABLE_RENDER_BACKEND_PROCESS:
+            self._renderer = partial(RenderPipeline.render_in_process, image_output)
         self._vacuum = RoborockVacuum(host, token)
-        self._connector = XiaomiCloudConnector(username, password)
+        self._connector = XiaomiCloudConnectorAsync(username, password)
         self._status = CameraStatus.INITIALIZING
         self._device = None
         self._host = host
@@ -223,20 +274,80 @@ class VacuumCamera(Camera):
         self._used_api = None
         self._map_saved = None
         self._image = None
+        self._rendered_image = None
+        self._resized_images = RenderCache(max_size=MAX_RESIZED_IMAGES)
         self._map_data = None
+        self._map_attributes = {}
         self._logged_in = False
         self._logged_in_previously = True
+        self._failed_map_retrievals = 0
         self._country = country
+        self._username = username
+        self._store = None
+        self._device_details = None
+        self._map_name_task = None
+        self._scheduler = PollScheduler(idle_scan_interval.total_seconds(), SCAN_INTERVAL.total_seconds(),
+                                        MAX_ERROR_BACKOFF.total_seconds(), IDLE_VACUUM_STATE_INTERVAL.total_seconds())
 
     async def async_added_to_hass(self) -> None:
+        self._connector.set_session(async_create_clientsession(self.hass))
+        self._store = Store(self.hass, STORAGE_VERSION, f"{DOMAIN}.{self.entity_id}", private=True)
+        await self._async_restore_session()
         self.async_schedule_update_ha_state(True)
 
+    async def _async_restore_session(self):
+        stored = await self._store.async_load()
+        if stored is None or stored.get(CONF_USERNAME) != self._username:
+            return
+        if self._connector.restore_session(stored.get("session", {})):
+            # session is validated by the first call to the cloud
+            _LOGGER.debug("Restored session")
+            self._logged_in = True
+            self._status = CameraStatus.LOGGED_IN
+        device = stored.get("device")
+        if device is not None and device.get(CONF_TOKEN) == self._token:
+            _LOGGER.debug("Restored device details")
+            self._device_details = tuple(device["details"])
+
+    async def _async_save_store(self):
+        if self._store is not None:
+            data = {
+                CONF_USERNAME: self._username,
+                "session": self._connector.session_data()
+            }
+            if self._device_details is not None:
+                data["device"] = {
+                    CONF_TOKEN: self._token,
+                    "details": list(self._device_details)
+                }
+            await self._store.async_save(data)
+
+    async def async_will_remove_from_hass(self) -> None:
+        if self._map_name_task is not None:
+            self._map_name_task.cancel()
+        await self._connector.async_close()
+
     @property
     def frame_interval(self) -> float:
         return 1
 
     def camera_image(self, width: Optional[int] = None, height: Optional[int] = None) -> Optional[bytes]:
-        return self._image
+        # hash and image are read together, map can be updated concurrently
+        rendered_image = self._rendered_image
+        if rendered_image is None or (width is None and height is None):
+            return self._image
+        image_hash, image, encoded = rendered_image
+        key = RenderCache.get_key(image_hash, width, height)
+        resized = self._resized_images.get(key)
+        if resized is None:
+            if image is None:
+                # map rendered in a worker process is kept only in encoded form
+                image = Image.open(io.BytesIO(encoded))
+            resized = self._encoder.encode_resized(image, width, height)
+            if resized is None:
+                return encoded
+            self._resized_images.put(key, resized)
+        return resized
 
     @property
     def name(self) -> str:
@@ -244,6 +355,7 @@ class VacuumCamera(Camera):
 
     def turn_on(self):
         self._should_poll = True
+        self._scheduler.reset()
 
     def turn_off(self):
         self._should_poll = False
@@ -254,14 +366,20 @@ class VacuumCamera(Camera):
 
     @property
     def extra_state_attributes(self) -> Dict[str, Any]:
-        attributes = {}
-        if self._map_data is not None:
-            attributes.update(self.extract_attributes(self._map_data, self._attributes, self._country))
+        attributes = dict(self._map_attributes)
         if self._store_map_raw:
             attributes[ATTRIBUTE_MAP_SAVED] = self._map_saved
+        if ATTRIBUTE_ENCODE_TIME in self._attributes:
+            attributes[ATTRIBUTE_ENCODE_TIME] = self._encoder.encode_time
+        if ATTRIBUTE_ENCODED_SIZE in self._attributes:
+            attributes[ATTRIBUTE_ENCODED_SIZE] = self._encoder.encoded_size
         if self._device is not None:
             attributes[ATTR_MODEL] = self._device.model
             attributes[ATTR_USED_API] = self._used_api
+            if ATTRIBUTE_MAP_CACHE_HITS in self._attributes:
+                attributes[ATTRIBUTE_MAP_CACHE_HITS] = self._device.map_cache_hits
+            if ATTRIBUTE_MAP_CACHE_MISSES in self._attributes:
+                attributes[ATTRIBUTE_MAP_CACHE_MISSES] = self._device.map_cache_misses
         if self._connector.two_factor_auth_url is not None:
             attributes[ATTR_TWO_FACTOR_AUTH] = self._connector.two_factor_auth_url
         return attributes
@@ -278,47 +396,124 @@ class VacuumCamera(Camera):
             rooms = dict(filter(lambda x: x[0] is not None, ((x[0], x[1].name) for x in map_data.rooms.items())))
             if len(rooms) == 0:
                 rooms = list(map_data.rooms.keys())
-        for name, value in {
-            ATTRIBUTE_CALIBRATION: map_data.calibration(),
-            ATTRIBUTE_CARPET_MAP: map_data.carpet_map,
-            ATTRIBUTE_CHARGER: map_data.charger,
-            ATTRIBUTE_CLEANED_ROOMS: map_data.cleaned_rooms,
-            ATTRIBUTE_COUNTRY: country,
-            ATTRIBUTE_GOTO: map_data.goto,
-            ATTRIBUTE_GOTO_PATH: map_data.goto_path,
-            ATTRIBUTE_GOTO_PREDICTED_PATH: map_data.predicted_path,
-            ATTRIBUTE_IGNORED_OBSTACLES: map_data.ignored_obstacles,
-            ATTRIBUTE_IGNORED_OBSTACLES_WITH_PHOTO: map_data.ignored_obstacles_with_photo,
-            ATTRIBUTE_IMAGE: map_data.image,
-            ATTRIBUTE_IS_EMPTY: map_data.image.is_empty,
-            ATTRIBUTE_MAP_NAME: map_data.map_name,
-            ATTRIBUTE_MOP_PATH: map_data.mop_path,
-            ATTRIBUTE_NO_CARPET_AREAS: map_data.no_carpet_areas,
-            ATTRIBUTE_NO_GO_AREAS: map_data.no_go_areas,
-            ATTRIBUTE_NO_MOPPING_AREAS: map_data.no_mopping_areas,
-            ATTRIBUTE_OBSTACLES: map_data.obstacles,
-            ATTRIBUTE_OBSTACLES_WITH_PHOTO: map_data.obstacles_with_photo,
-            ATTRIBUTE_PATH: map_data.path,
-            ATTRIBUTE_ROOM_NUMBERS: rooms,
-            ATTRIBUTE_ROOMS: map_data.rooms,
-            ATTRIBUTE_VACUUM_POSITION: map_data.vacuum_position,
-            ATTRIBUTE_VACUUM_ROOM: map_data.vacuum_room,
-            ATTRIBUTE_VACUUM_ROOM_NAME: map_data.vacuum_room_name,
-            ATTRIBUTE_WALLS: map_data.walls,
-            ATTRIBUTE_ZONES: map_data.zones
+        # values are read only when requested, so blocks of lazily parsed maps are not decoded needlessly
+        for name, get_value in {
+            ATTRIBUTE_CALIBRATION: lambda: map_data.calibration(),
+            ATTRIBUTE_CARPET_MAP: lambda: map_data.carpet_map,
+            ATTRIBUTE_CHARGER: lambda: map_data.charger,
+            ATTRIBUTE_CLEANED_ROOMS: lambda: map_data.cleaned_rooms,
+            ATTRIBUTE_COUNTRY: lambda: country,
+            ATTRIBUTE_GOTO: lambda: map_data.goto,
+            ATTRIBUTE_GOTO_PATH: lambda: map_data.goto_path,
+            ATTRIBUTE_GOTO_PREDICTED_PATH: lambda: map_data.predicted_path,
+            ATTRIBUTE_IGNORED_OBSTACLES: lambda: map_data.ignored_obstacles,
+            ATTRIBUTE_IGNORED_OBSTACLES_WITH_PHOTO: lambda: map_data.ignored_obstacles_with_photo,
+            ATTRIBUTE_IMAGE: lambda: map_data.image,
+            ATTRIBUTE_IS_EMPTY: lambda: map_data.image.is_empty,
+            ATTRIBUTE_MAP_NAME: lambda: map_data.map_name,
+            ATTRIBUTE_MOP_PATH: lambda: map_data.mop_path,
+            ATTRIBUTE_NO_CARPET_AREAS: lambda: map_data.no_carpet_areas,
+            ATTRIBUTE_NO_GO_AREAS: lambda: map_data.no_go_areas,
+            ATTRIBUTE_NO_MOPPING_AREAS: lambda: map_data.no_mopping_areas,
+            ATTRIBUTE_OBSTACLES: lambda: map_data.obstacles,
+            ATTRIBUTE_OBSTACLES_WITH_PHOTO: lambda: map_data.obstacles_with_photo,
+            ATTRIBUTE_PATH: lambda: map_data.path,
+            ATTRIBUTE_ROOM_NUMBERS: lambda: rooms,
+            ATTRIBUTE_ROOMS: lambda: map_data.rooms,
+            ATTRIBUTE_VACUUM_POSITION: lambda: map_data.vacuum_position,
+            ATTRIBUTE_VACUUM_ROOM: lambda: map_data.vacuum_room,
+            ATTRIBUTE_VACUUM_ROOM_NAME: lambda: map_data.vacuum_room_name,
+            ATTRIBUTE_WALLS: lambda: map_data.walls,
+            ATTRIBUTE_ZONES: lambda: map_data.zones
         }.items():
             if name in attributes_to_return:
-                attributes[name] = value
+                attributes[name] = get_value()
         return attributes
 
     def update(self):
+        if not self._is_update_due():
+            return
+        previous_map_data = self._map_data
         counter = 10
         if self._status != CameraStatus.TWO_FACTOR_AUTH_REQUIRED and not self._logged_in:
             self._handle_login()
         if self._device is None and self._logged_in:
             self._handle_device()
 
-        new_map_name = self._handle_map_name(counter)
+        self._update_map_name(self._handle_map_name(counter))
+
+        if self._can_retrieve_map():
+            self._handle_map_data(self._map_name)
+        else:
+            self._handle_map_not_available()
+        self._logged_in_previously = self._logged_in
+        self._schedule_next_update(previous_map_data)
+
+    async def async_update(self):
+        if not await self.hass.async_add_executor_job(self._is_update_due):
+            return
+        previous_map_data = self._map_data
+        counter = 10
+        if self._status != CameraStatus.TWO_FACTOR_AUTH_REQUIRED and not self._logged_in:
+            _LOGGER.debug("Logging in...")
+            self._set_login_result(await self._connector.async_login())
+            if self._logged_in:
+                await self._async_save_store()
+        if self._device is None and self._logged_in:
+            cached = self._device_details is not None
+            if not cached:
+                _LOGGER.debug("Retrieving device info, country: %s", self._country)
+                self._device_details = await self._connector.async_get_device_details(self._vacuum.token,
+                                                                                      self._country)
+            self._set_device_details(self._device_details)
+            if self._device is not None and not cached:
+                await self._async_save_store()
+
+        self._update_map_name(await self._async_handle_map_name(counter))
+
+        if self._can_retrieve_map():
+            _LOGGER.debug("Retrieving map from Xiaomi cloud")
+            # previous image is served until the new one is encoded
+            map_data, map_stored = await self._device.async_get_map(self._map_name, self._colors, self._drawables,
+                                                                    self._texts, self._sizes, self._image_config,
+                                                                    self._get_store_map_path(),
+                                                                    RenderPipeline.get_executor(), self._renderer)
+            await RenderPipeline.async_run(self._set_map_result, map_data, map_stored)
+        else:
+            await self.hass.async_add_executor_job(self._handle_map_not_available)
+        self._logged_in_previously = self._logged_in
+        self._schedule_next_update(previous_map_data)
+
+    def _is_update_due(self) -> bool:
+        if not self._should_poll:
+            # manual updates (homeassistant.update_entity) are never skipped
+            return True
+        vacuum_active = None
+        # only Roborock vacuums report their state over miio, others are scheduled by map changes only
+        if self._device is not None and self._device.should_get_map_from_vacuum() and \
+                self._scheduler.needs_vacuum_state():
+            vacuum_active = self._get_vacuum_activity()
+            self._scheduler.vacuum_state_checked()
+        if self._scheduler.is_update_due(vacuum_active):
+            return True
+        _LOGGER.debug("Skipping map update, vacuum active: %s", self._scheduler.vacuum_active)
+        return False
+
+    def _get_vacuum_activity(self) -> Optional[bool]:
+        # noinspection PyBroadException
+        try:
+            return self._vacuum.status().state_code in ACTIVE_VACUUM_STATE_CODES
+        except:
+            _LOGGER.debug("Unable to retrieve vacuum state")
+            return None
+
+    def _schedule_next_update(self, previous_map_data: Optional[MapData]):
+        if self._status in [CameraStatus.OK, CameraStatus.EMPTY_MAP]:
+            self._scheduler.update_finished(self._map_data is not previous_map_data)
+        else:
+            self._scheduler.update_failed()
+
+    def _update_map_name(self, new_map_name: str):
         if new_map_name != "retry":
             # sometimes this fails for no reason, so try and mitigate that by
             # falling back to the previous map name if we have one
@@ -327,17 +522,20 @@ class VacuumCamera(Camera):
         if self._map_name is None and self._device is not None:
             self._status = CameraStatus.FAILED_TO_RETRIEVE_MAP_FROM_VACUUM
 
-        if self._logged_in and self._map_name is not None and self._device is not None:
-            self._handle_map_data(self._map_name)
-        else:
-            _LOGGER.debug("Unable to retrieve map, reasons: Logged in - %s, map name - %s, device retrieved - %s",
-                          self._logged_in, new_map_name, self._device is not None)
-            self._set_map_data(MapDataParser.create_empty(self._colors, str(self._status)))
-        self._logged_in_previously = self._logged_in
+    def _can_retrieve_map(self) -> bool:
+        return self._logged_in and self._map_name is not None and self._device is not None
+
+    def _handle_map_not_available(self):
+        _LOGGER.debug("Unable to retrieve map, reasons: Logged in - %s, map name - %s, device retrieved - %s",
+                      self._logged_in, self._map_name, self._device is not None)
+        self._set_map_data(MapDataParser.create_empty(self._colors, str(self._status)))
 
     def _handle_login(self):
         _LOGGER.debug("Logging in...")
-        self._logged_in = self._connector.login()
+        self._set_login_result(self._connector.login())
+
+    def _set_login_result(self, logged_in: Optional[bool]):
+        self._logged_in = logged_in
         if self._logged_in is None:
             _LOGGER.debug("2FA required")
             self._status = CameraStatus.TWO_FACTOR_AUTH_REQUIRED
@@ -352,14 +550,24 @@ class VacuumCamera(Camera):
 
     def _handle_device(self):
         _LOGGER.debug("Retrieving device info, country: %s", self._country)
-        country, user_id, device_id, model, mac = self._connector.get_device_details(self._vacuum.token, self._country)
+        self._device_details = self._connector.get_device_details(self._vacuum.token, self._country)
+        self._set_device_details(self._device_details)
+
+    def _set_device_details(self, device_details: tuple):
+        country, user_id, device_id, model, mac = device_details
         if model is not None:
             self._country = country
             _LOGGER.debug("Retrieved device model: %s", model)
             self._device = self._create_device(user_id, device_id, model, mac)
             _LOGGER.debug("Created device, used api: %s", self._used_api)
+        elif self._connector.auth_failed:
+            _LOGGER.debug("Session expired")
+            self._device_details = None
+            self._logged_in = False
+            self._status = CameraStatus.NOT_LOGGED_IN
         else:
             _LOGGER.error("Failed to retrieve model")
+            self._device_details = None
             self._status = CameraStatus.FAILED_TO_RETRIEVE_DEVICE
 
     def _handle_map_name(self, counter: int) -> str:
@@ -382,26 +590,82 @@ class VacuumCamera(Camera):
         backoff = Backoff(min_sleep=0.1, max_sleep=15)
         while map_name == "retry" and i <= counter:
             _LOGGER.debug("Asking device for map name... (%s/%s)", i, counter)
-            try:
-                map_name = self._vacuum.map()[0]
-                if map_name != "retry":
-                    _LOGGER.debug("Map name %s", map_name)
-                    return map_name
-            except OSError as exc:
-                _LOGGER.error("Got OSError while fetching the state: %s", exc)
-            except DeviceException as exc:
-                _LOGGER.warning("Got exception while fetching the state: %s", exc)
+            map_name = self._get_map_name_from_vacuum()
+            if map_name != "retry":
+                return map_name
 
             i += 1
             time.sleep(backoff.backoff())
         return map_name
 
+    async def _async_handle_map_name(self, counter: int) -> str:
+        """
+        Non-blocking variant of _handle_map_name. The vacuum is asked once; if it answers "retry",
+        further attempts are made by a background task (see _async_retry_map_name) and "retry" is returned,
+        so the previous map name is used until the task finds a new one.
+        """
+        if self._device is not None and not self._device.should_get_map_from_vacuum():
+            return "0"
+        if self._map_name_task is not None:
+            return "retry"
+        _LOGGER.debug("Asking device for map name... (%s/%s)", 1, counter)
+        map_name = await self.hass.async_add_executor_job(self._get_map_name_from_vacuum)
+        if map_name == "retry":
+            self._map_name_task = self.hass.async_create_task(self._async_retry_map_name(counter))
+        return map_name
+
+    async def _async_retry_map_name(self, counter: int):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + MAP_NAME_RETRIEVAL_TIMEOUT.total_seconds()
+        map_name = "retry"
+        i = 2
+        backoff = Backoff(min_sleep=0.1, max_sleep=15)
+        try:
+            while map_name == "retry" and i <= counter:
+                delay = min(backoff.backoff(), deadline - loop.time())
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+                _LOGGER.debug("Asking device for map name... (%s/%s)", i, counter)
+                map_name = await self.hass.async_add_executor_job(self._get_map_name_from_vacuum)
+                i += 1
+        finally:
+            self._map_name_task = None
+        if map_name == "retry":
+            _LOGGER.debug("Unable to retrieve map name, using previous one: %s", self._map_name)
+            return
+        had_map_name = self._map_name is not None
+        self._update_map_name(map_name)
+        if not had_map_name:
+            # nothing was shown so far, don't wait for the next scheduled update
+            self._scheduler.reset()
+            self.async_schedule_update_ha_state(True)
+
+    def _get_map_name_from_vacuum(self) -> str:
+        try:
+            map_name = self._vacuum.map()[0]
+            if map_name != "retry":
+                _LOGGER.debug("Map name %s", map_name)
+            return map_name
+        except OSError as exc:
+            _LOGGER.error("Got OSError while fetching the state: %s", exc)
+        except DeviceException as exc:
+            _LOGGER.warning("Got exception while fetching the state: %s", exc)
+        return "retry"
+
     def _handle_map_data(self, map_name: str):
         _LOGGER.debug("Retrieving map from Xiaomi cloud")
-        store_map_path = self._store_map_path if self._store_map_raw else None
         map_data, map_stored = self._device.get_map(map_name, self._colors, self._drawables, self._texts,
-                                                    self._sizes, self._image_config, store_map_path)
+                                                    self._sizes, self._image_config, self._get_store_map_path(),
+                                                    self._renderer)
+        self._set_map_result(map_data, map_stored)
+
+    def _get_store_map_path(self) -> Optional[str]:
+        return self._store_map_path if self._store_map_raw else None
+
+    def _set_map_result(self, map_data: Optional[MapData], map_stored: bool):
         if map_data is not None:
+            self._failed_map_retrievals = 0
             # noinspection PyBroadException
             try:
                 _LOGGER.debug("Map data retrieved")
@@ -419,14 +683,26 @@ class VacuumCamera(Camera):
                 _LOGGER.warning("Unable to parse map data")
                 self._status = CameraStatus.UNABLE_TO_PARSE_MAP
         else:
-            self._logged_in = False
+            # keep the session after transient errors, log in again only if it was rejected
+            self._failed_map_retrievals = self._failed_map_retrievals + 1
+            if self._connector.auth_failed or self._failed_map_retrievals >= MAX_FAILED_MAP_RETRIEVALS:
+                self._logged_in = False
+                self._failed_map_retrievals = 0
             _LOGGER.warning("Unable to retrieve map data")
             self._status = CameraStatus.UNABLE_TO_RETRIEVE_MAP
 
     def _set_map_data(self, map_data: MapData):
-        img_byte_arr = io.BytesIO()
-        map_data.image.data.save(img_byte_arr, format='PNG')
-        self._image = img_byte_arr.getvalue()
+        if map_data is self._map_data:
+            # map did not change, image is already encoded
+            return
+        if map_data.image.encoded is not None:
+            self._image = self._encoder.use_encoded(map_data.image.encoded)
+        else:
+            self._image = self._encoder.encode(map_data.image.data)
+        self._rendered_image = (hashlib.sha1(self._image).hexdigest(), map_data.image.data, self._image)
+        # attributes are extracted once per map and outside of the event loop,
+        # where blocks of lazily parsed maps would be decoded otherwise
+        self._map_attributes = self.extract_attributes(map_data, self._attributes, self._country)
         self._map_data = map_data
         self._store_image()
 
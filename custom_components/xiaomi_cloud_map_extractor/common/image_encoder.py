@@ -0,0 +1,77 @@
+import io
+import time
+from typing import NamedTuple, Optional, Tuple
+
+from PIL import Image
+from PIL.Image import Image as ImageType
+
+from custom_components.xiaomi_cloud_map_extractor.const import *
+from custom_components.xiaomi_cloud_map_extractor.types import OutputConfig
+
+
+class EncodedImage(NamedTuple):
+    data: bytes
+    encode_time: float
+
+
+class ImageEncoder:
+    """Encodes map images in the configured format and keeps statistics of the last encoding."""
+
+    def __init__(self, output_config: OutputConfig):
+        self._config = output_config
+        self.encode_time: Optional[float] = None
+        self.encoded_size: Optional[int] = None
+
+    @property
+    def content_type(self) -> str:
+        return OUTPUT_CONTENT_TYPES[self._config[CONF_FORMAT]]
+
+    def encode(self, image: ImageType) -> bytes:
+        start = time.perf_counter()
+        encoded = self.__save__(image)
+        self.encode_time = round((time.perf_counter() - start) * 1000, 1)
+        self.encoded_size = len(encoded)
+        return encoded
+
+    def use_encoded(self, encoded: EncodedImage) -> bytes:
+        """Records statistics of an image encoded elsewhere (e.g. in a worker process)."""
+        self.encode_time = encoded.encode_time
+        self.encoded_size = len(encoded.data)
+        return encoded.data
+
+    def encode_resized(self, image: ImageType, width: Optional[int], height: Optional[int]) -> Optional[bytes]:
+        """
+        Encodes image downscaled to fit in width x height, keeping its aspect ratio.
+        Returns None if image already fits. Statistics of the last encoding are not updated.
+        """
+        size = ImageEncoder.get_fitted_size(image.size, width, height)
+        if size is None:
+            return None
+        return self.__save__(image.convert("RGBA").resize(size, resample=Image.LANCZOS))
+
+    @staticmethod
+    def get_fitted_size(size: Tuple[int, int], width: Optional[int],
+                        height: Optional[int]) -> Optional[Tuple[int, int]]:
+        image_width, image_height = size
+        ratio = min(width / image_width if width else 1, height / image_height if height else 1)
+        if ratio >= 1:
+            return None
+        return max(round(image_width * ratio), 1), max(round(image_height * ratio), 1)
+
+    def __save__(self, image: ImageType) -> bytes:
+        img_byte_arr = io.BytesIO()
+        output_format = self._config[CONF_FORMAT]
+        if output_format == CONF_AVAILABLE_FORMAT_JPEG:
+            # JPEG does not support transparency
+            image.convert("RGB").save(img_byte_arr, format="JPEG", quality=self._config[CONF_QUALITY])
+        elif output_format == CONF_AVAILABLE_FORMAT_WEBP:
+            if self._config[CONF_LOSSLESS]:
+                image.save(img_byte_arr, format="WEBP", lossless=True)
+            else:
+                image.save(img_byte_arr, format="WEBP", quality=self._config[CONF_QUALITY])
+        else:
+            # map without any drawn elements is already in palette mode
+            if self._config[CONF_QUANTIZE] and image.mode != "P":
+                image = image.convert("RGBA").quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+            image.save(img_byte_arr, format="PNG", compress_level=self._config[CONF_COMPRESS_LEVEL])
+        return img_byte_arr.getvalue()
@@ -1,7 +1,9 @@
 import logging
 import math
-from typing import Callable, Dict, List
+from fractions import Fraction
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 from PIL.Image import Image as ImageType
 
@@ -13,6 +15,22 @@ from custom_components.xiaomi_cloud_map_extractor.types import Color, Colors, Si
 _LOGGER = logging.getLogger(__name__)
 
 
+class RoomBounds(NamedTuple):
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+    pixels: int
+    center_x: float
+    center_y: float
+
+
+class SupersampledLayer(NamedTuple):
+    data: ImageType
+    bbox: Tuple[int, int, int, int]
+    overlay: ImageType
+
+
 class ImageHandler:
     COLORS = {
         COLOR_MAP_INSIDE: (32, 115, 185),
@@ -83,8 +101,60 @@ class ImageHandler:
         return image
 
     @staticmethod
-    def draw_path(image: ImageData, path: Path, sizes: Sizes, colors: Colors, scale: float):
-        ImageHandler.__draw_path__(image, path, sizes[CONF_SIZE_PATH_WIDTH], ImageHandler.__get_color__(COLOR_PATH, colors), scale)
+    def get_rooms_bounds(room_numbers: np.ndarray, offset_x: int = 0, offset_y: int = 0) -> Dict[int, RoomBounds]:
+        """
+        Calculates bounding box, number of pixels and centroid of every room in a single pass.
+        `room_numbers` holds a room number for each pixel of the map and a negative value for pixels outside of rooms.
+        """
+        room_y, room_x = np.nonzero(room_numbers >= 0)
+        if len(room_x) == 0:
+            return {}
+        labels = room_numbers[room_y, room_x].astype(np.intp)
+        counts = np.bincount(labels)
+        sums_x = np.bincount(labels, weights=room_x)
+        sums_y = np.bincount(labels, weights=room_y)
+        height, width = room_numbers.shape
+        columns = np.zeros((len(counts), width), dtype=bool)
+        columns[labels, room_x] = True
+        rows = np.zeros((len(counts), height), dtype=bool)
+        rows[labels, room_y] = True
+        x0 = columns.argmax(axis=1)
+        x1 = width - 1 - columns[:, ::-1].argmax(axis=1)
+        y0 = rows.argmax(axis=1)
+        y1 = height - 1 - rows[:, ::-1].argmax(axis=1)
+        rooms = {}
+        for number in np.flatnonzero(counts):
+            rooms[int(number)] = RoomBounds(int(x0[number]) + offset_x, int(y0[number]) + offset_y,
+                                            int(x1[number]) + offset_x, int(y1[number]) + offset_y,
+                                            int(counts[number]),
+                                            sums_x[number] / counts[number] + offset_x,
+                                            sums_y[number] / counts[number] + offset_y)
+        return rooms
+
+    @staticmethod
+    def get_palette(color_lut: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Splits (256, 4) lookup table of pixel type colors into a palette of distinct colors
+        and a lookup table of palette indexes.
+        """
+        palette, index_lut = np.unique(color_lut, axis=0, return_inverse=True)
+        return palette, index_lut.reshape(-1).astype(np.uint8)
+
+    @staticmethod
+    def create_palette_image(indexes: np.ndarray, palette: np.ndarray) -> ImageType:
+        """
+        Creates palette mode image of a base map, which is 4 times smaller than RGBA one.
+        It is converted to RGBA when anything is drawn on it (see __ensure_rgba__).
+        """
+        image = Image.fromarray(np.ascontiguousarray(indexes, dtype=np.uint8), "P")
+        image.putpalette(palette.astype(np.uint8).tobytes(), "RGBA")
+        return image
+
+    @staticmethod
+    def draw_path(image: ImageData, path: Path, sizes: Sizes, colors: Colors, scale: float,
+                  layer: Optional[SupersampledLayer] = None, continued: bool = False) -> Optional[SupersampledLayer]:
+        return ImageHandler.__draw_path__(image, path, sizes[CONF_SIZE_PATH_WIDTH], ImageHandler.__get_color__(COLOR_PATH, colors),
+                                          scale, layer, continued)
 
     @staticmethod
     def draw_goto_path(image: ImageData, path: Path, sizes: Sizes, colors: Colors, scale: float):
@@ -95,8 +165,10 @@ class ImageHandler:
         ImageHandler.__draw_path__(image, path, sizes[CONF_SIZE_PATH_WIDTH], ImageHandler.__get_color__(COLOR_PREDICTED_PATH, colors), scale)
 
     @staticmethod
-    def draw_mop_path(image: ImageData, path: Path, sizes: Sizes, colors: Colors, scale: float):
-        ImageHandler.__draw_path__(image, path, sizes[CONF_SIZE_MOP_PATH_WIDTH], ImageHandler.__get_color__(COLOR_MOP_PATH, colors), scale)
+    def draw_mop_path(image: ImageData, path: Path, sizes: Sizes, colors: Colors, scale: float,
+                      layer: Optional[SupersampledLayer] = None, continued: bool = False) -> Optional[SupersampledLayer]:
+        return ImageHandler.__draw_path__(image, path, sizes[CONF_SIZE_MOP_PATH_WIDTH], ImageHandler.__get_color__(COLOR_MOP_PATH, colors),
+                                          scale, layer, continued)
 
     @staticmethod
     def draw_no_carpet_areas(image: ImageData, areas: List[Area], colors: Colors):
@@ -118,10 +190,10 @@ class ImageHandler:
 
     @staticmethod
     def draw_walls(image: ImageData, walls: List[Wall], colors: Colors):
+        ImageHandler.__ensure_rgba__(image)
         draw = ImageDraw.Draw(image.data, 'RGBA')
-        for wall in walls:
-            draw.line(wall.to_img(image.dimensions).as_list(),
-                      ImageHandler.__get_color__(COLOR_VIRTUAL_WALLS, colors), width=2)
+        for wall in image.dimensions.to_img_coords([wall.as_list() for wall in walls]):
+            draw.line(wall, ImageHandler.__get_color__(COLOR_VIRTUAL_WALLS, colors), width=2)
 
     @staticmethod
     def draw_zones(image: ImageData, zones: List[Zone], colors: Colors):
@@ -163,8 +235,14 @@ class ImageHandler:
 
     @staticmethod
     def draw_all_obstacles(image: ImageData, obstacles: List[Obstacle], radius: float, color: Color):
+        def draw_shape(draw: ImageDraw, coords: List[float]):
+            draw.ellipse(coords, outline=color, fill=color)
+
+        shapes = []
         for obstacle in obstacles:
-            ImageHandler.__draw_circle__(image, obstacle, radius, color, color)
+            point = obstacle.to_img(image.dimensions)
+            shapes.append([point.x - radius, point.y - radius, point.x + radius, point.y + radius])
+        ImageHandler.__draw_batched__(image, shapes, draw_shape, ImageHandler.__use_transparency__(color))
 
     @staticmethod
     def draw_vacuum_position(image: ImageData, vacuum_position: Point, sizes: Sizes, colors: Colors):
@@ -176,11 +254,10 @@ class ImageHandler:
     @staticmethod
     def draw_room_names(image: ImageData, rooms: Dict[int, Room], colors: Colors):
         color = ImageHandler.__get_color__(COLOR_ROOM_NAMES, colors)
-        for room in rooms.values():
-            p = room.point()
-            if p is not None:
-                point = p.to_img(image.dimensions)
-                ImageHandler.__draw_text__(image, room.name, point.x, point.y, color)
+        rooms = [room for room in rooms.values() if room.point() is not None]
+        points = image.dimensions.to_img_coords([[room.pos_x, room.pos_y] for room in rooms])
+        for room, (x, y) in zip(rooms, points):
+            ImageHandler.__draw_text__(image, room.name, x, y, color)
 
     @staticmethod
     def rotate(image: ImageData):
@@ -203,6 +280,10 @@ class ImageHandler:
     def draw_layer(image: ImageData, layer_name: str):
         ImageHandler.__draw_layer__(image, image.additional_layers[layer_name])
 
+    @staticmethod
+    def draw_overlay(image: ImageData, layer: ImageType):
+        ImageHandler.__draw_layer__(image, layer)
+
     @staticmethod
     def __use_transparency__(*colors):
         return any(len(color) > 3 for color in colors)
@@ -280,40 +361,66 @@ class ImageHandler:
         if len(areas) == 0:
             return
 
-        use_transparency = ImageHandler.__use_transparency__(outline, fill)
-        for area in areas:
-            def draw_func(draw: ImageDraw):
-                draw.polygon(area.to_img(image.dimensions).as_list(), fill, outline)
+        def draw_shape(draw: ImageDraw, coords: List[float]):
+            draw.polygon(coords, fill, outline)
 
-            ImageHandler.__draw_on_new_layer__(image, draw_func, 1, use_transparency)
+        shapes = image.dimensions.to_img_coords([area.as_list() for area in areas])
+        ImageHandler.__draw_batched__(image, shapes, draw_shape, ImageHandler.__use_transparency__(outline, fill))
 
     @staticmethod
-    def __draw_path__(image: ImageData, path: Path, path_width: int, color: Color, scale: float):
-        if len(path.path) < 1:
-            return
+    def draw_path_lines(draw: ImageDraw, points: np.ndarray, segment_offsets: np.ndarray, path_width: int,
+                        color: Color, scale: float, continued: bool = False):
+        """
+        Draws path given in coordinates of a layer supersampled by scale.
+        Paths wider than 4 pixels get a round cap on every vertex, so their segments are joined smoothly.
+        If continued, the first point is the last point of a path already drawn on the layer with its cap.
+        """
+        width = int(scale * path_width)
+        r = scale * path_width / 2
+        for start, end in zip(segment_offsets[:-1], segment_offsets[1:]):
+            if end - start < 2:
+                continue
+            segment = points[start:end]
+            draw.line(segment.ravel().tolist(), width=width, fill=color)
+            if path_width > 4:
+                caps = segment[1:] if continued and start == 0 else segment
+                for x, y in caps.tolist():
+                    draw.pieslice([x - r, y - r, x + r, y + r], 0, 360, outline=color, fill=color)
 
-        def draw_func(draw: ImageDraw):
-            for current_path in path.path:
-                if len(current_path) > 1:
-                    s = current_path[0].to_img(image.dimensions)
-                    coords = None
-                    for point in current_path[1:]:
-                        e = point.to_img(image.dimensions)
-                        sx = s.x * scale
-                        sy = s.y * scale
-                        ex = e.x * scale
-                        ey = e.y * scale
-                        draw.line([sx, sy, ex, ey], width=int(scale * path_width), fill=color)
-                        if path_width > 4:
-                            r = scale * path_width / 2
-                            if not coords:
-                                coords = [sx - r, sy - r, sx + r, sy + r]
-                                draw.pieslice(coords, 0, 360, outline=color, fill=color)
-                            coords = [ex - r, ey - r, ex + r, ey + r]
-                            draw.pieslice(coords, 0, 360, outline=color, fill=color)
-                        s = e
-
-        ImageHandler.__draw_on_new_layer__(image, draw_func, scale, ImageHandler.__use_transparency__(color))
+    @staticmethod
+    def __draw_path__(image: ImageData, path: Path, path_width: int, color: Color, scale: float,
+                      layer: Optional[SupersampledLayer] = None,
+                      continued: bool = False) -> Optional[SupersampledLayer]:
+        """
+        Draws path on a layer supersampled by scale, which covers only the part of the image with the path.
+        If layer with an already drawn part of the path is given, the rest of the path is drawn on its copy,
+        so the result is the same as drawing the whole path at once. Returns the layer for the next call.
+        """
+        ImageHandler.__ensure_rgba__(image)
+        bbox = None
+        if any(len(segment) > 1 for segment in path):
+            img_points = image.dimensions.to_img_array(path.points)
+            bbox = ImageHandler.__get_layer_bbox__(image, img_points, path_width / 2 + 1, scale)
+        if bbox is None:
+            if layer is not None:
+                image.data.alpha_composite(layer.overlay, layer.bbox[:2])
+            return layer
+        if layer is not None:
+            bbox = (min(bbox[0], layer.bbox[0]), min(bbox[1], layer.bbox[1]),
+                    max(bbox[2], layer.bbox[2]), max(bbox[3], layer.bbox[3]))
+        x0, y0, x1, y1 = bbox
+        layer_x0, layer_y0 = ImageHandler.__get_layer_origin__(image, bbox, scale)
+        layer_x1, layer_y1 = ImageHandler.__get_layer_origin__(image, (x1, y1), scale)
+        data = Image.new("RGBA", (layer_x1 - layer_x0, layer_y1 - layer_y0), (255, 255, 255, 0))
+        if layer is not None:
+            drawn_x0, drawn_y0 = ImageHandler.__get_layer_origin__(image, layer.bbox, scale)
+            data.paste(layer.data, (drawn_x0 - layer_x0, drawn_y0 - layer_y0))
+        layer_points = img_points * scale - (layer_x0, layer_y0)
+        ImageHandler.draw_path_lines(ImageDraw.Draw(data, "RGBA"), layer_points, path.segment_offsets, path_width,
+                                     color, scale, continued)
+        overlay = data if scale == 1 else data.resize((x1 - x0, y1 - y0), resample=Image.BOX)
+        image.data.alpha_composite(overlay, (x0, y0))
+        return SupersampledLayer(data, bbox, overlay)
 
     @staticmethod
     def __draw_text__(image: ImageData, text: str, x: float, y: float, color: Color, font_file=None, font_size=None):
@@ -341,8 +448,16 @@ class ImageHandler:
             return ImageHandler.COLORS[name]
         return ImageHandler.COLORS[default_name]
 
+    @staticmethod
+    def __get_rgba_color__(name, colors: Colors, default_name: str = None) -> Color:
+        color = ImageHandler.__get_color__(name, colors, default_name)
+        if len(color) == 3:
+            return color[0], color[1], color[2], 255
+        return color
+
     @staticmethod
     def __draw_on_new_layer__(image: ImageData, draw_function: Callable, scale: float = 1, use_transparency=False):
+        ImageHandler.__ensure_rgba__(image)
         if scale == 1 and not use_transparency:
             draw = ImageDraw.Draw(image.data, "RGBA")
             draw_function(draw)
@@ -355,6 +470,79 @@ class ImageHandler:
                 layer = layer.resize(image.data.size, resample=Image.BOX)
             ImageHandler.__draw_layer__(image, layer)
 
+    @staticmethod
+    def __get_layer_bbox__(image: ImageData, points: np.ndarray, margin: float,
+                           scale: float) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Returns part of the image covering points with margin. Its bounds are whole pixels of both the image
+        and the layer supersampled by scale, so a layer covering this part is drawn and downsampled
+        exactly like the same part of a layer covering the whole image.
+        """
+        x_factor, y_factor = ImageHandler.__get_layer_factors__(image, scale)
+        width, height = image.data.size
+        # downsampling is translation invariant only if factor is exact in floating point,
+        # otherwise the layer spans the whole axis
+        x_step = x_factor.denominator if x_factor.denominator & (x_factor.denominator - 1) == 0 else width
+        y_step = y_factor.denominator if y_factor.denominator & (y_factor.denominator - 1) == 0 else height
+        x0 = max(math.floor(points[:, 0].min() - margin) // x_step * x_step, 0)
+        y0 = max(math.floor(points[:, 1].min() - margin) // y_step * y_step, 0)
+        x1 = min(math.ceil((points[:, 0].max() + margin) / x_step) * x_step, width)
+        y1 = min(math.ceil((points[:, 1].max() + margin) / y_step) * y_step, height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    @staticmethod
+    def __get_layer_origin__(image: ImageData, bbox: Tuple[int, ...], scale: float) -> Tuple[int, int]:
+        x_factor, y_factor = ImageHandler.__get_layer_factors__(image, scale)
+        return int(bbox[0] * x_factor), int(bbox[1] * y_factor)
+
+    @staticmethod
+    def __get_layer_factors__(image: ImageData, scale: float) -> Tuple[Fraction, Fraction]:
+        # layer covering the whole image is int(size * scale) pixels large, so it is downsampled by these factors
+        width, height = image.data.size
+        return Fraction(int(width * scale), width), Fraction(int(height * scale), height)
+
+    @staticmethod
+    def __draw_batched__(image: ImageData, shapes: List[List[float]], draw_shape: Callable, use_transparency: bool):
+        """
+        Draws all shapes of a single drawable, compositing as few layers as possible.
+        A shape overlapping any shape already drawn on the current layer starts a new layer,
+        so overlapping translucent shapes are still blended with each other.
+        """
+        ImageHandler.__ensure_rgba__(image)
+        if not use_transparency:
+            draw = ImageDraw.Draw(image.data, "RGBA")
+            for coords in shapes:
+                draw_shape(draw, coords)
+            return
+        layer = None
+        draw = None
+        boxes = []
+        for coords in shapes:
+            # outline of a shape is drawn on the pixels surrounding its vertices
+            box = (min(coords[0::2]) - 1, min(coords[1::2]) - 1, max(coords[0::2]) + 1, max(coords[1::2]) + 1)
+            if layer is None or any(ImageHandler.__boxes_overlap__(box, b) for b in boxes):
+                if layer is not None:
+                    ImageHandler.__draw_layer__(image, layer)
+                layer = Image.new("RGBA", image.data.size, (255, 255, 255, 0))
+                draw = ImageDraw.Draw(layer, "RGBA")
+                boxes = []
+            draw_shape(draw, coords)
+            boxes.append(box)
+        if layer is not None:
+            ImageHandler.__draw_layer__(image, layer)
+
+    @staticmethod
+    def __boxes_overlap__(a, b) -> bool:
+        return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+    @staticmethod
+    def __ensure_rgba__(image: ImageData):
+        if image.data.mode != "RGBA":
+            image.data = image.data.convert("RGBA")
+
     @staticmethod
     def __draw_layer__(image: ImageData, layer: ImageType):
+        ImageHandler.__ensure_rgba__(image)
         image.data = Image.alpha_composite(image.data, layer)
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from typing import Any, Callable, Dict, List, Optional, Set
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
 
+import numpy as np
 from PIL.Image import Image as ImageType
 
+from custom_components.xiaomi_cloud_map_extractor.common.image_encoder import EncodedImage
 from custom_components.xiaomi_cloud_map_extractor.const import *
 from custom_components.xiaomi_cloud_map_extractor.types import CalibrationPoints, ImageConfig
 
@@ -77,7 +79,8 @@ class Obstacle(Point):
 
 class ImageDimensions:
     def __init__(self, top: int, left: int, height: int, width: int, scale: float, rotation: int,
-                 img_transformation: Callable[[Point], Point]):
+                 img_transformation: Callable[[Point], Point],
+                 img_transformation_array: Optional[Callable[[np.ndarray], np.ndarray]] = None):
         self.top = top
         self.left = left
         self.height = height
@@ -85,15 +88,40 @@ class ImageDimensions:
         self.scale = scale
         self.rotation = rotation
         self.img_transformation = img_transformation
+        self.img_transformation_array = img_transformation_array
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # transformations are usually lambdas, which cannot be pickled; unpickled dimensions cannot convert points
+        state = self.__dict__.copy()
+        state["img_transformation"] = None
+        state["img_transformation_array"] = None
+        return state
 
     def to_img(self, point: Point) -> Point:
         p = self.img_transformation(point)
         return Point((p.x - self.left) * self.scale, (self.height - (p.y - self.top) - 1) * self.scale)
 
+    def to_img_array(self, xy: np.ndarray) -> np.ndarray:
+        """Vectorized to_img: converts (N, 2) array of map coordinates to image coordinates."""
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        if self.img_transformation_array is not None:
+            p = self.img_transformation_array(xy)
+        else:
+            points = [self.img_transformation(Point(*c)) for c in xy.tolist()]
+            p = np.array([[q.x, q.y] for q in points], dtype=np.float64).reshape(-1, 2)
+        return np.column_stack(((p[:, 0] - self.left) * self.scale, (self.height - (p[:, 1] - self.top) - 1) * self.scale))
+
+    def to_img_coords(self, coords: List[List[float]]) -> List[List[float]]:
+        """Converts flat [x0, y0, x1, y1, ...] lists of equal length (e.g. walls, areas) in one call."""
+        if len(coords) == 0:
+            return []
+        return self.to_img_array(np.array(coords)).reshape(len(coords), -1).tolist()
+
 
 class ImageData:
     def __init__(self, size: int, top: int, left: int, height: int, width: int, image_config: ImageConfig,
-                 data: ImageType, img_transformation: Callable[[Point], Point], additional_layers: dict = None):
+                 data: ImageType, img_transformation: Callable[[Point], Point], additional_layers: dict = None,
+                 img_transformation_array: Optional[Callable[[np.ndarray], np.ndarray]] = None):
         trim_left = int(image_config[CONF_TRIM][CONF_LEFT] * width / 100)
         trim_right = int(image_config[CONF_TRIM][CONF_RIGHT] * width / 100)
         trim_top = int(image_config[CONF_TRIM][CONF_TOP] * height / 100)
@@ -106,9 +134,11 @@ class ImageData:
                                           height - trim_top - trim_bottom,
                                           width - trim_left - trim_right,
                                           scale,
-                                          rotation, img_transformation)
+                                          rotation, img_transformation, img_transformation_array)
         self.is_empty = height == 0 or width == 0
         self.data = data
+        # set instead of data when image was rendered and encoded in a worker process
+        self.encoded: Optional[EncodedImage] = None
         if additional_layers is None:
             self.additional_layers = {}
         else:
@@ -137,23 +167,99 @@ class ImageData:
             CONF_SCALE: 1,
             CONF_ROTATE: 0
         }
-        return ImageData(0, 0, 0, 0, 0, image_config, data, lambda p: p)
+        return ImageData(0, 0, 0, 0, 0, image_config, data, lambda p: p, img_transformation_array=lambda xy: xy)
 
 
 class Path:
+    """
+    Path stored as (N, 2) array of point coordinates and offsets of consecutive segments
+    (segment i consists of points[segment_offsets[i]:segment_offsets[i + 1]]).
+    Coordinates are int64 if a vacuum reports integer ones and float64 otherwise, so attributes keep their types.
+    Iterating over a path yields its segments as (n, 2) arrays.
+    """
+
     def __init__(self, point_length: Optional[int], point_size: Optional[int], angle: Optional[int],
                  path: List[List[Point]]):
+        points = [(p.x, p.y) for segment in path for p in segment]
         self.point_length = point_length
         self.point_size = point_size
         self.angle = angle
-        self.path = path
+        self.points = Path.__to_points_array__(points)
+        self.segment_offsets = np.cumsum([0] + [len(segment) for segment in path])
+
+    @staticmethod
+    def from_array(point_length: Optional[int], point_size: Optional[int], angle: Optional[int],
+                   points: np.ndarray, segment_offsets: Optional[np.ndarray] = None) -> Path:
+        path = Path(point_length, point_size, angle, [])
+        path.points = Path.__to_points_array__(points)
+        if segment_offsets is None:
+            segment_offsets = [0, len(path.points)]
+        path.segment_offsets = np.asarray(segment_offsets)
+        return path
+
+    @staticmethod
+    def __to_points_array__(points) -> np.ndarray:
+        points = np.asarray(points)
+        dtype = np.int64 if np.issubdtype(points.dtype, np.integer) else np.float64
+        return points.astype(dtype, copy=False).reshape(-1, 2)
+
+    @property
+    def path(self) -> List[List[Point]]:
+        return [[Point(x, y) for x, y in segment.tolist()] for segment in self]
+
+    def __len__(self) -> int:
+        return len(self.segment_offsets) - 1
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for start, end in zip(self.segment_offsets[:-1], self.segment_offsets[1:]):
+            yield self.points[start:end]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            segments = range(len(self))[index]
+            if len(segments) == 0:
+                return Path.from_array(0, self.point_size, self.angle, self.points[:0], np.zeros(1, dtype=np.int64))
+            if segments.step != 1:
+                raise ValueError("Path slice step is not supported")
+            offsets = self.segment_offsets[segments.start:segments.stop + 1]
+            points = self.points[offsets[0]:offsets[-1]]
+            return Path.from_array(len(points), self.point_size, self.angle, points, offsets - offsets[0])
+        segment = range(len(self))[index]
+        return self.points[self.segment_offsets[segment]:self.segment_offsets[segment + 1]]
 
     def as_dict(self) -> Dict[str, Any]:
         return {
             ATTR_POINT_LENGTH: self.point_length,
             ATTR_POINT_SIZE: self.point_size,
             ATTR_ANGLE: self.angle,
-            ATTR_PATH: self.path
+            ATTR_PATH: [[{ATTR_X: x, ATTR_Y: y} for x, y in segment.tolist()] for segment in self]
+        }
+
+
+class CarpetMap:
+    """
+    Carpet pixels of a map image stored as a flat boolean mask, in the order of image pixels in the map.
+    Exposed as runs of consecutive carpet pixels instead of indexes of all of them.
+    """
+
+    def __init__(self, mask: np.ndarray):
+        self.mask = mask
+
+    def get_mask(self, size: int) -> np.ndarray:
+        mask = np.zeros(size, dtype=bool)
+        length = min(size, len(self.mask))
+        mask[:length] = self.mask[:length]
+        return mask
+
+    def runs(self) -> np.ndarray:
+        """Returns (N, 2) array of start index and length of each run of carpet pixels."""
+        edges = np.flatnonzero(np.diff(self.mask, prepend=False, append=False))
+        return np.column_stack((edges[0::2], edges[1::2] - edges[0::2]))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            ATTR_SIZE: len(self.mask),
+            ATTR_RUNS: self.runs().tolist()
         }
 
 
@@ -235,9 +341,7 @@ class Wall:
         }
 
     def to_img(self, image_dimensions) -> Wall:
-        p0 = Point(self.x0, self.y0).to_img(image_dimensions)
-        p1 = Point(self.x1, self.y1).to_img(image_dimensions)
-        return Wall(p0.x, p0.y, p1.x, p1.y)
+        return Wall(*image_dimensions.to_img_coords([self.as_list()])[0])
 
     def as_list(self) -> List[float]:
         return [self.x0, self.y0, self.x1, self.y1]
@@ -276,11 +380,7 @@ class Area:
         return [self.x0, self.y0, self.x1, self.y1, self.x2, self.y2, self.x3, self.y3]
 
     def to_img(self, image_dimensions) -> Area:
-        p0 = Point(self.x0, self.y0).to_img(image_dimensions)
-        p1 = Point(self.x1, self.y1).to_img(image_dimensions)
-        p2 = Point(self.x2, self.y2).to_img(image_dimensions)
-        p3 = Point(self.x3, self.y3).to_img(image_dimensions)
-        return Area(p0.x, p0.y, p1.x, p1.y, p2.x, p2.y, p3.x, p3.y)
+        return Area(*image_dimensions.to_img_coords([self.as_list()])[0])
 
 
 class MapData:
@@ -295,7 +395,7 @@ class MapData:
         self.no_go_areas: Optional[List[Area]] = None
         self.no_mopping_areas: Optional[List[Area]] = None
         self.no_carpet_areas: Optional[List[Area]] = None
-        self.carpet_map: Optional[Set[int]] = []
+        self.carpet_map: Optional[CarpetMap] = None
         self.obstacles: Optional[List[Obstacle]] = None
         self.ignored_obstacles: Optional[List[Obstacle]] = None
         self.obstacles_with_photo: Optional[List[Obstacle]] = None
@@ -311,8 +411,19 @@ class MapData:
         self.zones: Optional[List[Zone]] = None
         self.cleaned_rooms: Optional[Set[int]] = None
         self.map_name: Optional[str] = None
+        self.map_index: Optional[int] = None
+        self.map_sequence: Optional[int] = None
+        self._calibration_points: Optional[CalibrationPoints] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # calibration points need image transformations, which are not pickled
+        state = self.__dict__.copy()
+        state["_calibration_points"] = self.calibration()
+        return state
 
     def calibration(self) -> Optional[CalibrationPoints]:
+        if self._calibration_points is not None:
+            return self._calibration_points
         if self.image.is_empty:
             return None
         calibration_points = []
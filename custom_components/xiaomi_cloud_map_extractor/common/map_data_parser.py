@@ -1,7 +1,14 @@
+import copy
+import hashlib
 import logging
+from typing import Any, Callable, List, Optional
 
-from custom_components.xiaomi_cloud_map_extractor.common.image_handler import ImageHandler
-from custom_components.xiaomi_cloud_map_extractor.common.map_data import ImageData, MapData
+import numpy as np
+from PIL import Image
+
+from custom_components.xiaomi_cloud_map_extractor.common.image_handler import ImageHandler, SupersampledLayer
+from custom_components.xiaomi_cloud_map_extractor.common.map_data import ImageData, MapData, Path
+from custom_components.xiaomi_cloud_map_extractor.common.render_cache import PathLayer, RenderCache
 from custom_components.xiaomi_cloud_map_extractor.const import *
 from custom_components.xiaomi_cloud_map_extractor.types import Colors, Drawables, ImageConfig, Sizes, Texts
 
@@ -9,6 +16,10 @@ _LOGGER = logging.getLogger(__name__)
 
 
 class MapDataParser:
+    STATIC_DRAWABLES = [DRAWABLE_NO_CARPET_AREAS, DRAWABLE_NO_GO_AREAS, DRAWABLE_NO_MOPPING_AREAS,
+                        DRAWABLE_VIRTUAL_WALLS, DRAWABLE_ZONES, DRAWABLE_ROOM_NAMES]
+    render_cache = RenderCache()
+    path_cache = RenderCache(max_size=8)
 
     @staticmethod
     def create_empty(colors: Colors, text: str) -> MapData:
@@ -26,39 +37,144 @@ class MapDataParser:
     def draw_elements(colors: Colors, drawables: Drawables, sizes: Sizes, map_data: MapData, image_config: ImageConfig):
         scale = float(image_config[CONF_SCALE])
 
+        # consecutive static drawables are rendered together to keep the configured drawing order
+        static_drawables = []
         for drawable in drawables:
-            if DRAWABLE_CHARGER == drawable and map_data.charger is not None:
-                ImageHandler.draw_charger(map_data.image, map_data.charger, sizes, colors)
-            if DRAWABLE_VACUUM_POSITION == drawable and map_data.vacuum_position is not None:
-                ImageHandler.draw_vacuum_position(map_data.image, map_data.vacuum_position, sizes, colors)
-            if DRAWABLE_OBSTACLES == drawable and map_data.obstacles is not None:
-                ImageHandler.draw_obstacles(map_data.image, map_data.obstacles, sizes, colors)
-            if DRAWABLE_IGNORED_OBSTACLES == drawable and map_data.ignored_obstacles is not None:
-                ImageHandler.draw_ignored_obstacles(map_data.image, map_data.ignored_obstacles, sizes, colors)
-            if DRAWABLE_OBSTACLES_WITH_PHOTO == drawable and map_data.obstacles_with_photo is not None:
-                ImageHandler.draw_obstacles_with_photo(map_data.image, map_data.obstacles_with_photo, sizes, colors)
-            if DRAWABLE_IGNORED_OBSTACLES_WITH_PHOTO == drawable and map_data.ignored_obstacles_with_photo is not None:
-                ImageHandler.draw_ignored_obstacles_with_photo(map_data.image, map_data.ignored_obstacles_with_photo,
-                                                               sizes, colors)
-            if DRAWABLE_MOP_PATH == drawable and map_data.mop_path is not None:
-                ImageHandler.draw_mop_path(map_data.image, map_data.mop_path, sizes, colors, scale)
-            if DRAWABLE_PATH == drawable and map_data.path is not None:
-                ImageHandler.draw_path(map_data.image, map_data.path, sizes, colors, scale)
-            if DRAWABLE_GOTO_PATH == drawable and map_data.goto_path is not None:
-                ImageHandler.draw_goto_path(map_data.image, map_data.goto_path, sizes, colors, scale)
-            if DRAWABLE_PREDICTED_PATH == drawable and map_data.predicted_path is not None:
-                ImageHandler.draw_predicted_path(map_data.image, map_data.predicted_path, sizes, colors, scale)
-            if DRAWABLE_NO_CARPET_AREAS == drawable and map_data.no_carpet_areas is not None:
-                ImageHandler.draw_no_carpet_areas(map_data.image, map_data.no_carpet_areas, colors)
-            if DRAWABLE_NO_GO_AREAS == drawable and map_data.no_go_areas is not None:
-                ImageHandler.draw_no_go_areas(map_data.image, map_data.no_go_areas, colors)
-            if DRAWABLE_NO_MOPPING_AREAS == drawable and map_data.no_mopping_areas is not None:
-                ImageHandler.draw_no_mopping_areas(map_data.image, map_data.no_mopping_areas, colors)
-            if DRAWABLE_VIRTUAL_WALLS == drawable and map_data.walls is not None:
-                ImageHandler.draw_walls(map_data.image, map_data.walls, colors)
-            if DRAWABLE_ZONES == drawable and map_data.zones is not None:
-                ImageHandler.draw_zones(map_data.image, map_data.zones, colors)
-            if DRAWABLE_CLEANED_AREA == drawable and DRAWABLE_CLEANED_AREA in map_data.image.additional_layers:
-                ImageHandler.draw_layer(map_data.image, drawable)
-            if DRAWABLE_ROOM_NAMES == drawable and map_data.rooms is not None:
-                ImageHandler.draw_room_names(map_data.image, map_data.rooms, colors)
+            if drawable in MapDataParser.STATIC_DRAWABLES:
+                static_drawables.append(drawable)
+                continue
+            MapDataParser.draw_static_elements(colors, static_drawables, sizes, map_data, image_config)
+            static_drawables = []
+            MapDataParser.__draw_element__(colors, drawable, sizes, map_data, scale)
+        MapDataParser.draw_static_elements(colors, static_drawables, sizes, map_data, image_config)
+
+    @staticmethod
+    def draw_static_elements(colors: Colors, drawables: Drawables, sizes: Sizes, map_data: MapData,
+                             image_config: ImageConfig):
+        geometry = [MapDataParser.__get_static_geometry__(drawable, map_data) for drawable in drawables]
+        if all(g is None for g in geometry):
+            return
+        key = RenderCache.get_key(drawables, geometry, map_data.image.data.size, sorted(colors.items()),
+                                  sorted(sizes.items()), image_config)
+        layer = MapDataParser.render_cache.get(key)
+        if layer is None:
+            canvas = copy.copy(map_data)
+            canvas.image = copy.copy(map_data.image)
+            canvas.image.data = Image.new("RGBA", map_data.image.data.size, (0, 0, 0, 0))
+            scale = float(image_config[CONF_SCALE])
+            for drawable in drawables:
+                MapDataParser.__draw_element__(colors, drawable, sizes, canvas, scale)
+            layer = canvas.image.data
+            MapDataParser.render_cache.put(key, layer)
+        ImageHandler.draw_overlay(map_data.image, layer)
+
+    @staticmethod
+    def draw_path_layer(drawable: str, path: Path, map_data: MapData, colors: Colors, sizes: Sizes, scale: float,
+                        draw_path: Callable[..., Optional[SupersampledLayer]]):
+        """
+        Draws path using a cached layer. While a vacuum is cleaning its path only grows, so when the cached layer
+        contains beginning of the path, only new points are drawn on it. Layer is drawn from scratch when
+        map index changes or map sequence resets.
+        """
+        dimensions = map_data.image.dimensions
+        key = RenderCache.get_key(drawable, map_data.map_index, map_data.image.data.size,
+                                  (dimensions.top, dimensions.left, dimensions.height, dimensions.width),
+                                  dimensions.to_img_array(path.points[:1]).tolist(), sorted(colors.items()),
+                                  sorted(sizes.items()), scale)
+        cached = MapDataParser.path_cache.get(key)
+        tail = MapDataParser.__get_path_tail__(path, map_data.map_sequence, cached)
+        if tail is None:
+            layer = draw_path(map_data.image, path, sizes, colors, scale)
+        else:
+            # layer is kept supersampled, so the tail is drawn exactly like with the rest of the path
+            continued = cached.segment_offsets[-1] - cached.segment_offsets[-2] > 1
+            layer = draw_path(map_data.image, tail, sizes, colors, scale, cached.layer, continued)
+        points_hash = hashlib.sha1(path.points.tobytes()).digest()
+        MapDataParser.path_cache.put(key, PathLayer(layer, path.segment_offsets, points_hash, map_data.map_sequence))
+
+    @staticmethod
+    def __get_path_tail__(path: Path, map_sequence: Optional[int], cached: Optional[PathLayer]) -> Optional[Path]:
+        """Returns part of the path that is not drawn on the cached layer or None if it has to be drawn again."""
+        if cached is None or len(cached.segment_offsets) < 2:
+            return None
+        if map_sequence is not None and cached.map_sequence is not None and map_sequence < cached.map_sequence:
+            return None
+        segments = len(cached.segment_offsets) - 1
+        drawn = cached.segment_offsets[-1]
+        offsets = path.segment_offsets
+        if len(offsets) <= segments or offsets[segments] < drawn or \
+                not np.array_equal(offsets[:segments], cached.segment_offsets[:segments]):
+            return None
+        if hashlib.sha1(path.points[:drawn].tobytes()).digest() != cached.points_hash:
+            return None
+        # continue the last drawn segment from its last point
+        start = max(drawn - 1, offsets[segments - 1])
+        return Path.from_array(None, path.point_size, path.angle, path.points[start:],
+                               np.concatenate(([start], offsets[segments:])) - start)
+
+    @staticmethod
+    def __get_static_geometry__(drawable: str, map_data: MapData) -> Optional[List[Any]]:
+        dimensions = map_data.image.dimensions
+        if drawable == DRAWABLE_NO_CARPET_AREAS:
+            areas = map_data.no_carpet_areas
+        elif drawable == DRAWABLE_NO_GO_AREAS:
+            areas = map_data.no_go_areas
+        elif drawable == DRAWABLE_NO_MOPPING_AREAS:
+            areas = map_data.no_mopping_areas
+        elif drawable == DRAWABLE_ZONES:
+            areas = None if map_data.zones is None else [z.as_area() for z in map_data.zones]
+        elif drawable == DRAWABLE_VIRTUAL_WALLS:
+            if map_data.walls is None:
+                return None
+            return dimensions.to_img_coords([w.as_list() for w in map_data.walls])
+        elif drawable == DRAWABLE_ROOM_NAMES:
+            if map_data.rooms is None:
+                return None
+            rooms = [room for room in map_data.rooms.values() if room.point() is not None]
+            points = dimensions.to_img_coords([[room.pos_x, room.pos_y] for room in rooms])
+            return [(room.name, x, y) for room, (x, y) in zip(rooms, points)]
+        else:
+            return None
+        if areas is None:
+            return None
+        return dimensions.to_img_coords([a.as_list() for a in areas])
+
+    @staticmethod
+    def __draw_element__(colors: Colors, drawable: str, sizes: Sizes, map_data: MapData, scale: float):
+        if DRAWABLE_CHARGER == drawable and map_data.charger is not None:
+            ImageHandler.draw_charger(map_data.image, map_data.charger, sizes, colors)
+        if DRAWABLE_VACUUM_POSITION == drawable and map_data.vacuum_position is not None:
+            ImageHandler.draw_vacuum_position(map_data.image, map_data.vacuum_position, sizes, colors)
+        if DRAWABLE_OBSTACLES == drawable and map_data.obstacles is not None:
+            ImageHandler.draw_obstacles(map_data.image, map_data.obstacles, sizes, colors)
+        if DRAWABLE_IGNORED_OBSTACLES == drawable and map_data.ignored_obstacles is not None:
+            ImageHandler.draw_ignored_obstacles(map_data.image, map_data.ignored_obstacles, sizes, colors)
+        if DRAWABLE_OBSTACLES_WITH_PHOTO == drawable and map_data.obstacles_with_photo is not None:
+            ImageHandler.draw_obstacles_with_photo(map_data.image, map_data.obstacles_with_photo, sizes, colors)
+        if DRAWABLE_IGNORED_OBSTACLES_WITH_PHOTO == drawable and map_data.ignored_obstacles_with_photo is not None:
+            ImageHandler.draw_ignored_obstacles_with_photo(map_data.image, map_data.ignored_obstacles_with_photo,
+                                                           sizes, colors)
+        if DRAWABLE_MOP_PATH == drawable and map_data.mop_path is not None:
+            MapDataParser.draw_path_layer(drawable, map_data.mop_path, map_data, colors, sizes, scale,
+                                          ImageHandler.draw_mop_path)
+        if DRAWABLE_PATH == drawable and map_data.path is not None:
+            MapDataParser.draw_path_layer(drawable, map_data.path, map_data, colors, sizes, scale,
+                                          ImageHandler.draw_path)
+        if DRAWABLE_GOTO_PATH == drawable and map_data.goto_path is not None:
+            ImageHandler.draw_goto_path(map_data.image, map_data.goto_path, sizes, colors, scale)
+        if DRAWABLE_PREDICTED_PATH == drawable and map_data.predicted_path is not None:
+            ImageHandler.draw_predicted_path(map_data.image, map_data.predicted_path, sizes, colors, scale)
+        if DRAWABLE_NO_CARPET_AREAS == drawable and map_data.no_carpet_areas is not None:
+            ImageHandler.draw_no_carpet_areas(map_data.image, map_data.no_carpet_areas, colors)
+        if DRAWABLE_NO_GO_AREAS == drawable and map_data.no_go_areas is not None:
+            ImageHandler.draw_no_go_areas(map_data.image, map_data.no_go_areas, colors)
+        if DRAWABLE_NO_MOPPING_AREAS == drawable and map_data.no_mopping_areas is not None:
+            ImageHandler.draw_no_mopping_areas(map_data.image, map_data.no_mopping_areas, colors)
+        if DRAWABLE_VIRTUAL_WALLS == drawable and map_data.walls is not None:
+            ImageHandler.draw_walls(map_data.image, map_data.walls, colors)
+        if DRAWABLE_ZONES == drawable and map_data.zones is not None:
+            ImageHandler.draw_zones(map_data.image, map_data.zones, colors)
+        if DRAWABLE_CLEANED_AREA == drawable and DRAWABLE_CLEANED_AREA in map_data.image.additional_layers:
+            ImageHandler.draw_layer(map_data.image, drawable)
+        if DRAWABLE_ROOM_NAMES == drawable and map_data.rooms is not None:
+            ImageHandler.draw_room_names(map_data.image, map_data.rooms, colors)
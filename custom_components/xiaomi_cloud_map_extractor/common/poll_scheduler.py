@@ -0,0 +1,59 @@
+import time
+from typing import Optional
+
+from custom_components.xiaomi_cloud_map_extractor.common.backoff import Backoff
+
+
+class PollScheduler:
+    """
+    Decides whether a map update is due.
+    Vacuum that is working (or whose map keeps changing) is polled on every update,
+    idle one only once per idle_interval. Failed updates are retried with exponential backoff.
+    """
+
+    def __init__(self, idle_interval: float, min_error_delay: float, max_error_delay: float, state_interval: float):
+        self._idle_interval = idle_interval
+        self._min_error_delay = min_error_delay
+        self._max_error_delay = max_error_delay
+        self._state_interval = state_interval
+        self._backoff = None
+        self._next_update = 0
+        self._next_state_check = 0
+        self.vacuum_active: Optional[bool] = None
+
+    def needs_vacuum_state(self) -> bool:
+        # working vacuum is asked on every update to notice that it has stopped,
+        # idle one (or one that does not report its state) once per state_interval or when update is due anyway
+        now = time.monotonic()
+        return bool(self.vacuum_active) or now >= self._next_state_check or now >= self._next_update
+
+    def vacuum_state_checked(self):
+        self._next_state_check = time.monotonic() + self._state_interval
+
+    def is_update_due(self, vacuum_active: Optional[bool] = None) -> bool:
+        """
+        Checks if map should be updated now.
+        Vacuum that has just started working (vacuum_active changed to True) is updated immediately.
+        """
+        started = vacuum_active and not self.vacuum_active
+        if vacuum_active is not None:
+            self.vacuum_active = vacuum_active
+        if started and self._backoff is None:
+            return True
+        return time.monotonic() >= self._next_update
+
+    def update_finished(self, map_changed: bool):
+        self._backoff = None
+        if self.vacuum_active or map_changed:
+            self._next_update = 0
+        else:
+            self._next_update = time.monotonic() + self._idle_interval
+
+    def update_failed(self):
+        if self._backoff is None:
+            self._backoff = Backoff(min_sleep=self._min_error_delay, max_sleep=self._max_error_delay)
+        self._next_update = time.monotonic() + self._backoff.backoff()
+
+    def reset(self):
+        self._backoff = None
+        self._next_update = 0
@@ -0,0 +1,52 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional, Union
+
+import numpy as np
+from PIL.Image import Image as ImageType
+
+from custom_components.xiaomi_cloud_map_extractor.common.image_handler import SupersampledLayer
+
+
+class PathLayer(NamedTuple):
+    layer: Optional[SupersampledLayer]
+    segment_offsets: np.ndarray
+    points_hash: bytes
+    map_sequence: Optional[int]
+
+
+class RenderCache:
+    """Thread-safe LRU cache of pre-rendered RGBA overlay layers and encoded images."""
+
+    def __init__(self, max_size: int = 16):
+        self._max_size = max_size
+        self._layers: OrderedDict[str, Union[ImageType, PathLayer, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(*parts: Any) -> str:
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Union[ImageType, PathLayer, bytes]]:
+        with self._lock:
+            layer = self._layers.get(key)
+            if layer is None:
+                self.misses = self.misses + 1
+                return None
+            self._layers.move_to_end(key)
+            self.hits = self.hits + 1
+            return layer
+
+    def put(self, key: str, layer: Union[ImageType, PathLayer, bytes]):
+        with self._lock:
+            self._layers[key] = layer
+            self._layers.move_to_end(key)
+            while len(self._layers) > self._max_size:
+                self._layers.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._layers.clear()
@@ -0,0 +1,80 @@
+import asyncio
+import inspect
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from custom_components.xiaomi_cloud_map_extractor.common.image_encoder import EncodedImage, ImageEncoder
+from custom_components.xiaomi_cloud_map_extractor.common.map_data import MapData
+from custom_components.xiaomi_cloud_map_extractor.types import Colors, Drawables, ImageConfig, OutputConfig, Sizes, \
+    Texts
+
+MAX_RENDER_WORKERS = 2
+
+MapParser = Callable[[Any, Colors, Drawables, Texts, Sizes, ImageConfig], Optional[MapData]]
+MapRenderer = Callable[[MapParser, Any, Colors, Drawables, Texts, Sizes, ImageConfig], Optional[MapData]]
+
+
+def render_map(parse_map: MapParser, unpacked_map: Any, colors: Colors, drawables: Drawables, texts: Texts,
+               sizes: Sizes, image_config: ImageConfig, output_config: OutputConfig) -> Optional[MapData]:
+    """
+    Runs in a worker process. Returned map carries the encoded image instead of its pixels,
+    so only a few kilobytes are sent back to Home Assistant.
+    """
+    map_data = parse_map(unpacked_map, colors, drawables, texts, sizes, image_config)
+    if map_data is None:
+        return None
+    encoder = ImageEncoder(output_config)
+    encoded = encoder.encode(map_data.image.data)
+    map_data.image.encoded = EncodedImage(encoded, encoder.encode_time)
+    map_data.image.data = None
+    map_data.image.additional_layers = {}
+    return map_data
+
+
+class RenderPipeline:
+    """
+    Bounded pool for CPU heavy stages of map processing (unpacking, parsing, rendering and encoding).
+    It is shared by all cameras, so maps of several vacuums processed at once do not occupy
+    Home Assistant's executor, which is used by other integrations and to serve camera images.
+    """
+    _executor: Optional[Executor] = None
+    _process_executor: Optional[Executor] = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_executor() -> Executor:
+        with RenderPipeline._lock:
+            if RenderPipeline._executor is None:
+                RenderPipeline._executor = ThreadPoolExecutor(max_workers=MAX_RENDER_WORKERS,
+                                                              thread_name_prefix="xiaomi_cloud_map_extractor")
+            return RenderPipeline._executor
+
+    @staticmethod
+    def get_process_executor() -> Executor:
+        with RenderPipeline._lock:
+            if RenderPipeline._process_executor is None:
+                # forking a multithreaded Home Assistant process is not safe
+                RenderPipeline._process_executor = ProcessPoolExecutor(
+                    max_workers=MAX_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            return RenderPipeline._process_executor
+
+    @staticmethod
+    async def async_run(func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(RenderPipeline.get_executor(), func, *args)
+
+    @staticmethod
+    def render_in_process(output_config: OutputConfig, parse_map: MapParser, unpacked_map: Any, colors: Colors,
+                          drawables: Drawables, texts: Texts, sizes: Sizes,
+                          image_config: ImageConfig) -> Optional[MapData]:
+        """
+        Parses and renders map in a worker process, so maps of different vacuums are rendered on separate cores
+        without holding the GIL of Home Assistant's process.
+        """
+        if inspect.ismethod(parse_map):
+            # parser bound to a vacuum cannot be sent to another process
+            return parse_map(unpacked_map, colors, drawables, texts, sizes, image_config)
+        future = RenderPipeline.get_process_executor().submit(render_map, parse_map, unpacked_map, colors,
+                                                              drawables, texts, sizes, image_config, output_config)
+        return future.result()
@@ -1,13 +1,21 @@
+import asyncio
+import hashlib
 from abc import abstractmethod
-from typing import Optional, Tuple
+from concurrent.futures import Executor
+from typing import Any, Dict, Optional, Tuple
 
 from custom_components.xiaomi_cloud_map_extractor.common.map_data import MapData
 from custom_components.xiaomi_cloud_map_extractor.common.map_data_parser import MapDataParser
+from custom_components.xiaomi_cloud_map_extractor.common.render_pipeline import MapRenderer
 from custom_components.xiaomi_cloud_map_extractor.common.xiaomi_cloud_connector import XiaomiCloudConnector
 from custom_components.xiaomi_cloud_map_extractor.types import Colors, Drawables, ImageConfig, Sizes, Texts
 
 
 class XiaomiCloudVacuum:
+    _last_map_hash: Optional[bytes] = None
+    _last_map_data: Optional[MapData] = None
+    map_cache_hits: int = 0
+    map_cache_misses: int = 0
 
     def __init__(self, connector: XiaomiCloudConnector, country: str, user_id: str, device_id: str, model: str):
         self._connector = connector
@@ -23,20 +31,64 @@ class XiaomiCloudVacuum:
                 texts: Texts,
                 sizes: Sizes,
                 image_config: ImageConfig,
-                store_map_path: Optional[str] = None) -> Tuple[Optional[MapData], bool]:
+                store_map_path: Optional[str] = None,
+                renderer: Optional[MapRenderer] = None) -> Tuple[Optional[MapData], bool]:
         response = self.get_raw_map_data(map_name)
+        return self.process_map(response, map_name, colors, drawables, texts, sizes, image_config, store_map_path,
+                                renderer)
+
+    async def async_get_map(self,
+                            map_name: str,
+                            colors: Colors,
+                            drawables: Drawables,
+                            texts: Texts,
+                            sizes: Sizes,
+                            image_config: ImageConfig,
+                            store_map_path: Optional[str] = None,
+                            executor: Optional[Executor] = None,
+                            renderer: Optional[MapRenderer] = None) -> Tuple[Optional[MapData], bool]:
+        """Downloads map asynchronously and processes it in given executor (default one if not provided)."""
+        response = await self.async_get_raw_map_data(map_name)
+        return await asyncio.get_running_loop().run_in_executor(executor, self.process_map, response, map_name,
+                                                                colors, drawables, texts, sizes, image_config,
+                                                                store_map_path, renderer)
+
+    def process_map(self,
+                    response: Optional[bytes],
+                    map_name: str,
+                    colors: Colors,
+                    drawables: Drawables,
+                    texts: Texts,
+                    sizes: Sizes,
+                    image_config: ImageConfig,
+                    store_map_path: Optional[str] = None,
+                    renderer: Optional[MapRenderer] = None) -> Tuple[Optional[MapData], bool]:
+        """Parsing and rendering of the unpacked map can be delegated to renderer (e.g. a worker process)."""
         if response is None:
             return None, False
+        # robots that are not working keep uploading byte-identical maps
+        map_hash = hashlib.sha1(response).digest()
+        if map_hash == self._last_map_hash and self._last_map_data is not None:
+            self.map_cache_hits = self.map_cache_hits + 1
+            self._last_map_data.map_name = map_name
+            return self._last_map_data, store_map_path is not None
+        self.map_cache_misses = self.map_cache_misses + 1
         map_stored = False
         if store_map_path is not None:
             raw_map_file = open(f"{store_map_path}/map_data_{self.model}.{self.get_map_archive_extension()}", "wb")
             raw_map_file.write(response)
             raw_map_file.close()
             map_stored = True
-        map_data = self.decode_map(response, colors, drawables, texts, sizes, image_config)
+        unpacked_map = self.unpack_map(response)
+        if renderer is None:
+            map_data = self.parse_map(unpacked_map, colors, drawables, texts, sizes, image_config)
+        else:
+            map_data = renderer(self.parse_map, unpacked_map, colors, drawables, texts, sizes, image_config)
         if map_data is None:
             return None, map_stored
         map_data.map_name = map_name
+        self._last_map_hash = map_hash
+        self._last_map_data = map_data
         return map_data, map_stored
 
     def get_raw_map_data(self, map_name: Optional[str]) -> Optional[bytes]:
@@ -45,6 +97,29 @@ class XiaomiCloudVacuum:
         map_url = self.get_map_url(map_name)
         return self._connector.get_raw_map_data(map_url)
 
+    async def async_get_raw_map_data(self, map_name: Optional[str]) -> Optional[bytes]:
+        if map_name is None:
+            return None
+        map_url = await self.async_get_map_url(map_name)
+        return await self._connector.async_get_raw_map_data(map_url)
+
+    def get_map_url(self, map_name: str) -> Optional[str]:
+        url, params = self.get_map_url_request(map_name)
+        return self.get_map_url_from_response(self._connector.execute_api_call_encrypted(url, params))
+
+    async def async_get_map_url(self, map_name: str) -> Optional[str]:
+        url, params = self.get_map_url_request(map_name)
+        return self.get_map_url_from_response(await self._connector.async_execute_api_call_encrypted(url, params))
+
+    @staticmethod
+    def get_map_url_from_response(api_response: Any) -> Optional[str]:
+        if api_response is None or \
+                "result" not in api_response or \
+                api_response["result"] is None or \
+                "url" not in api_response["result"]:
+            return None
+        return api_response["result"]["url"]
+
     def decode_map(self,
                    raw_map: bytes,
                    colors: Colors,
@@ -52,10 +127,24 @@ class XiaomiCloudVacuum:
                    texts: Texts,
                    sizes: Sizes,
                    image_config: ImageConfig) -> Optional[MapData]:
+        return self.parse_map(self.unpack_map(raw_map), colors, drawables, texts, sizes, image_config)
+
+    def unpack_map(self, raw_map: bytes) -> Any:
+        """Decompresses (and decrypts) downloaded map."""
+        return raw_map
+
+    def parse_map(self,
+                  unpacked_map: Any,
+                  colors: Colors,
+                  drawables: Drawables,
+                  texts: Texts,
+                  sizes: Sizes,
+                  image_config: ImageConfig) -> Optional[MapData]:
+        """Parses unpacked map and renders its image."""
         return MapDataParser.create_empty(colors, f"Vacuum\n{self.model}\nis not supported")
 
     @abstractmethod
-    def get_map_url(self, map_name: str) -> Optional[str]:
+    def get_map_url_request(self, map_name: str) -> Tuple[str, Dict[str, str]]:
         pass
 
     @abstractmethod
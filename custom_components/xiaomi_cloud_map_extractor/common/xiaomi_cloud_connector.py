@@ -6,7 +6,12 @@ import logging
 import os
 import random
 import time
-from typing import Any, Dict, NamedTuple, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
 from Crypto.Cipher import ARC4
 
 import requests
@@ -29,15 +34,27 @@ class XiaomiDeviceInfo(NamedTuple):
     country: str
     home_id: int
     user_id: int
+    mac: Optional[str] = None
+
+
+DeviceDetails = Tuple[Optional[str], Optional[str], Optional[str], Optional[str], Optional[str]]
+
+MAX_PARALLEL_COUNTRY_PROBES = 4
+# authentication result of the country probe running in the current context, None outside of probes
+PROBE_AUTH_FAILED: ContextVar[Optional[bool]] = ContextVar("probe_auth_failed", default=None)
 
 
 # noinspection PyBroadException
 class XiaomiCloudConnector:
 
-    def __init__(self, username: str, password: str):
+    def __init__(self, username: str, password: str, account_url: str = "https://account.xiaomi.com",
+                 api_url: Optional[str] = None):
         self.two_factor_auth_url = None
+        self.auth_failed = False
         self._username = username
         self._password = password
+        self._account_url = account_url
+        self._api_url = api_url
         self._agent = self.generate_agent()
         self._device_id = self.generate_device_id()
         self._session = requests.session()
@@ -51,16 +68,12 @@ class XiaomiCloudConnector:
         self._serviceToken = None
 
     def login_step_1(self) -> bool:
-        url = "https://account.xiaomi.com/pass/serviceLogin?sid=xiaomiio&_json=true"
-        headers = {
-            "User-Agent": self._agent,
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
+        url = self._account_url + "/pass/serviceLogin?sid=xiaomiio&_json=true"
         cookies = {
             "userId": self._username
         }
         try:
-            response = self._session.get(url, headers=headers, cookies=cookies, timeout=10)
+            response = self._session.get(url, headers=self._get_login_headers(), cookies=cookies, timeout=10)
         except:
             response = None
         successful = response is not None and response.status_code == 200 and "_sign" in self.to_json(response.text)
@@ -69,60 +82,65 @@ class XiaomiCloudConnector:
         return successful
 
     def login_step_2(self) -> bool:
-        url = "https://account.xiaomi.com/pass/serviceLoginAuth2"
-        headers = {
-            "User-Agent": self._agent,
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-        fields = {
-            "sid": "xiaomiio",
-            "hash": hashlib.md5(str.encode(self._password)).hexdigest().upper(),
-            "callback": "https://sts.api.io.mi.com/sts",
-            "qs": "%3Fsid%3Dxiaomiio%26_json%3Dtrue",
-            "user": self._username,
-            "_sign": self._sign,
-            "_json": "true"
-        }
+        url = self._account_url + "/pass/serviceLoginAuth2"
         try:
-            response = self._session.post(url, headers=headers, params=fields, timeout=10)
+            response = self._session.post(url, headers=self._get_login_headers(), params=self._get_login_fields(),
+                                          timeout=10)
         except:
             response = None
         successful = response is not None and response.status_code == 200
         if successful:
-            json_resp = self.to_json(response.text)
-            successful = "ssecurity" in json_resp and len(str(json_resp["ssecurity"])) > 4
-            if successful:
-                self._ssecurity = json_resp["ssecurity"]
-                self._userId = json_resp["userId"]
-                self._cUserId = json_resp["cUserId"]
-                self._passToken = json_resp["passToken"]
-                self._location = json_resp["location"]
-                self._code = json_resp["code"]
-                self.two_factor_auth_url = None
-            else:
-                if "notificationUrl" in json_resp:
-                    _LOGGER.error(
-                        "Additional authentication required. " +
-                        "Open following URL using device that has the same public IP, " +
-                        "as your Home Assistant instance: %s ",
-                        json_resp["notificationUrl"])
-                    self.two_factor_auth_url = json_resp["notificationUrl"]
-                    successful = None
-
+            successful = self._handle_login_step_2_response(response.text)
         return successful
 
     def login_step_3(self) -> bool:
-        headers = {
-            "User-Agent": self._agent,
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
         try:
-            response = self._session.get(self._location, headers=headers, timeout=10)
+            response = self._session.get(self._location, headers=self._get_login_headers(), timeout=10)
         except:
             response = None
         successful = response is not None and response.status_code == 200 and "serviceToken" in response.cookies
         if successful:
             self._serviceToken = response.cookies.get("serviceToken")
+            self.auth_failed = False
+        return successful
+
+    def _get_login_headers(self) -> Dict[str, str]:
+        return {
+            "User-Agent": self._agent,
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+
+    def _get_login_fields(self) -> Dict[str, str]:
+        return {
+            "sid": "xiaomiio",
+            "hash": hashlib.md5(str.encode(self._password)).hexdigest().upper(),
+            "callback": "https://sts.api.io.mi.com/sts",
+            "qs": "%3Fsid%3Dxiaomiio%26_json%3Dtrue",
+            "user": self._username,
+            "_sign": self._sign,
+            "_json": "true"
+        }
+
+    def _handle_login_step_2_response(self, response_text: str) -> Optional[bool]:
+        json_resp = self.to_json(response_text)
+        successful = "ssecurity" in json_resp and len(str(json_resp["ssecurity"])) > 4
+        if successful:
+            self._ssecurity = json_resp["ssecurity"]
+            self._userId = json_resp["userId"]
+            self._cUserId = json_resp["cUserId"]
+            self._passToken = json_resp["passToken"]
+            self._location = json_resp["location"]
+            self._code = json_resp["code"]
+            self.two_factor_auth_url = None
+        else:
+            if "notificationUrl" in json_resp:
+                _LOGGER.error(
+                    "Additional authentication required. " +
+                    "Open following URL using device that has the same public IP, " +
+                    "as your Home Assistant instance: %s ",
+                    json_resp["notificationUrl"])
+                self.two_factor_auth_url = json_resp["notificationUrl"]
+                successful = None
         return successful
 
     def login(self) -> bool:
@@ -136,6 +154,31 @@ class XiaomiCloudConnector:
         self._session.cookies.set("deviceId", self._device_id, domain="xiaomi.com")
         return self.login_step_1() and self.login_step_2() and self.login_step_3()
 
+    def session_data(self) -> Dict[str, Any]:
+        return {
+            "user_id": self._userId,
+            "ssecurity": self._ssecurity,
+            "service_token": self._serviceToken,
+            "agent": self._agent,
+            "device_id": self._device_id
+        }
+
+    def restore_session(self, session_data: Dict[str, Any]) -> bool:
+        """
+        Restores session saved with session_data without contacting Xiaomi account servers.
+        Session is not validated here; an encrypted API call rejected by the cloud sets auth_failed.
+        """
+        if any(session_data.get(key) is None
+               for key in ["user_id", "ssecurity", "service_token", "agent", "device_id"]):
+            return False
+        self._userId = session_data["user_id"]
+        self._ssecurity = session_data["ssecurity"]
+        self._serviceToken = session_data["service_token"]
+        self._agent = session_data["agent"]
+        self._device_id = session_data["device_id"]
+        self.auth_failed = False
+        return True
+
     def get_raw_map_data(self, map_url) -> Optional[bytes]:
         if map_url is not None:
             try:
@@ -197,6 +240,7 @@ class XiaomiCloudConnector:
                 country=country,
                 user_id=owner_id,
                 home_id=home_id,
+                mac=device.get("mac"),
             )
             for device in raw_devices
         )
@@ -211,23 +255,17 @@ class XiaomiCloudConnector:
                 )
                 yield from devices
 
-    def get_device_details_from_home(self, token: str, country: Optional[str] = None):
+    def get_device_details_from_home(self, token: str, country: Optional[str] = None) -> DeviceDetails:
         devices = self.get_devices_iter(country)
         matching_token = filter(lambda device: device.token == token, devices)
         if match := next(matching_token, None):
-            return match.country, match.user_id, match.device_id, match.model
+            return match.country, match.user_id, match.device_id, match.model, match.mac
 
         return None, None, None, None, None
 
-    def get_device_details(self, token: str,
-                           country: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
-        countries_to_check = CONF_AVAILABLE_COUNTRIES
-        if country is not None:
-            countries_to_check = [country]
-        for c in countries_to_check:
-            devices = self.get_devices(c)
-            if devices is None:
-                continue
+    def get_device_details_from_device_list(self, token: str, country: str) -> DeviceDetails:
+        devices = self.get_devices(country)
+        if devices is not None:
             found = list(filter(lambda d: str(d["token"]).casefold() == str(token).casefold(),
                                 devices["result"]["list"]))
             if len(found) > 0:
@@ -235,8 +273,53 @@ class XiaomiCloudConnector:
                 device_id = found[0]["did"]
                 model = found[0]["model"]
                 mac = found[0]["mac"]
-                return c, user_id, device_id, model, mac
-        return self.get_device_details_from_home(token, country)
+                return country, user_id, device_id, model, mac
+        return None, None, None, None, None
+
+    def get_device_details(self, token: str, country: Optional[str]) -> DeviceDetails:
+        countries_to_check = CONF_AVAILABLE_COUNTRIES
+        if country is not None:
+            countries_to_check = [country]
+        for find_device in [self.get_device_details_from_device_list, self.get_device_details_from_home]:
+            details = self.probe_countries(partial(find_device, token), countries_to_check)
+            if details[3] is not None:
+                return details
+        return None, None, None, None, None
+
+    def probe_countries(self, find_device: Callable[[str], DeviceDetails], countries: List[str]) -> DeviceDetails:
+        """
+        Searches all countries concurrently and returns the device found in the first country of the list.
+        Searches that have not started yet are cancelled once device is found.
+        Each search records its own authentication result, so searches still running in the background
+        do not change auth_failed.
+        """
+        if len(countries) == 1:
+            return find_device(countries[0])
+        executor = ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_COUNTRY_PROBES, len(countries)))
+        try:
+            futures = [executor.submit(self._probe_country, find_device, c) for c in countries]
+            auth_failed = False
+            for future in futures:
+                try:
+                    details, probe_auth_failed = future.result()
+                except:
+                    continue
+                if details[3] is not None:
+                    self.auth_failed = probe_auth_failed
+                    return details
+                auth_failed = auth_failed or probe_auth_failed
+            self.auth_failed = auth_failed
+            return None, None, None, None, None
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _probe_country(find_device: Callable[[str], DeviceDetails], country: str) -> Tuple[DeviceDetails, bool]:
+        token = PROBE_AUTH_FAILED.set(False)
+        try:
+            return find_device(country), PROBE_AUTH_FAILED.get()
+        finally:
+            PROBE_AUTH_FAILED.reset(token)
 
     def get_devices(self, country: str) -> Any:
         url = self.get_api_url(country) + "/home/device_list"
@@ -246,14 +329,34 @@ class XiaomiCloudConnector:
         return self.execute_api_call_encrypted(url, params)
 
     def execute_api_call_encrypted(self, url: str, params: Dict[str, str]) -> Any:
-        headers = {
+        fields = self._get_encrypted_call_fields(url, params)
+        try:
+            response = self._session.post(url, headers=self._get_api_call_headers(),
+                                          cookies=self._get_api_call_cookies(), params=fields, timeout=10)
+        except:
+            response = None
+        self._set_auth_failed(response is not None and response.status_code in [401, 403])
+        if response is not None and response.status_code == 200:
+            return self._decode_encrypted_response(fields, response.text)
+        return None
+
+    def _set_auth_failed(self, auth_failed: bool):
+        if PROBE_AUTH_FAILED.get() is None:
+            self.auth_failed = auth_failed
+        else:
+            PROBE_AUTH_FAILED.set(auth_failed)
+
+    def _get_api_call_headers(self) -> Dict[str, str]:
+        return {
             "Accept-Encoding": "identity",
             "User-Agent": self._agent,
             "Content-Type": "application/x-www-form-urlencoded",
             "x-xiaomi-protocal-flag-cli": "PROTOCAL-HTTP2",
             "MIOT-ENCRYPT-ALGORITHM": "ENCRYPT-RC4",
         }
-        cookies = {
+
+    def _get_api_call_cookies(self) -> Dict[str, str]:
+        return {
             "userId": str(self._userId),
             "yetAnotherServiceToken": str(self._serviceToken),
             "serviceToken": str(self._serviceToken),
@@ -263,21 +366,20 @@ class XiaomiCloudConnector:
             "dst_offset": "3600000",
             "channel": "MI_APP_STORE"
         }
+
+    def _get_encrypted_call_fields(self, url: str, params: Dict[str, str]) -> Dict[str, str]:
         millis = round(time.time() * 1000)
         nonce = self.generate_nonce(millis)
         signed_nonce = self.signed_nonce(nonce)
-        fields = self.generate_enc_params(url, "POST", signed_nonce, nonce, params, self._ssecurity)
+        return self.generate_enc_params(url, "POST", signed_nonce, nonce, params, self._ssecurity)
 
-        try:
-            response = self._session.post(url, headers=headers, cookies=cookies, params=fields, timeout=10)
-        except:
-            response = None
-        if response is not None and response.status_code == 200:
-            decoded = self.decrypt_rc4(self.signed_nonce(fields["_nonce"]), response.text)
-            return json.loads(decoded)
-        return None
+    def _decode_encrypted_response(self, fields: Dict[str, str], response_text: str) -> Any:
+        decoded = self.decrypt_rc4(self.signed_nonce(fields["_nonce"]), response_text)
+        return json.loads(decoded)
 
     def get_api_url(self, country: str) -> str:
+        if self._api_url is not None:
+            return self._api_url
         return "https://" + ("" if country == "cn" else (country + ".")) + "api.io.mi.com/app"
 
     def signed_nonce(self, nonce: str) -> str:
@@ -300,7 +402,7 @@ class XiaomiCloudConnector:
 
     @staticmethod
     def generate_signature(url, signed_nonce: str, nonce: str, params: Dict[str, str]) -> str:
-        signature_params = [url.split("com")[1], signed_nonce, nonce]
+        signature_params = [urlparse(url).path, signed_nonce, nonce]
         for k, v in params.items():
             signature_params.append(f"{k}={v}")
         signature_string = "&".join(signature_params)
@@ -309,7 +411,7 @@ class XiaomiCloudConnector:
 
     @staticmethod
     def generate_enc_signature(url, method: str, signed_nonce: str, params: Dict[str, str]) -> str:
-        signature_params = [str(method).upper(), url.split("com")[1].replace("/app/", "/")]
+        signature_params = [str(method).upper(), urlparse(url).path.replace("/app/", "/")]
         for k, v in params.items():
             signature_params.append(f"{k}={v}")
         signature_params.append(signed_nonce)
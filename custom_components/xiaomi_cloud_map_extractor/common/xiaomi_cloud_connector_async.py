@@ -0,0 +1,256 @@
+import asyncio
+import json
+import logging
+from functools import partial
+from http.cookies import SimpleCookie
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from yarl import URL
+
+from custom_components.xiaomi_cloud_map_extractor.common.xiaomi_cloud_connector import \
+    MAX_PARALLEL_COUNTRY_PROBES, PROBE_AUTH_FAILED, DeviceDetails, XiaomiCloudConnector, XiaomiDeviceInfo, XiaomiHome
+from custom_components.xiaomi_cloud_map_extractor.const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+
+# noinspection PyBroadException
+class XiaomiCloudConnectorAsync(XiaomiCloudConnector):
+    """
+    Asyncio variant of XiaomiCloudConnector.
+    All network calls are made with aiohttp session, which can be shared with Home Assistant's connection pool
+    (see set_session). Blocking methods of XiaomiCloudConnector remain available.
+    """
+
+    def __init__(self, username: str, password: str, account_url: str = "https://account.xiaomi.com",
+                 api_url: Optional[str] = None, session: Optional[aiohttp.ClientSession] = None):
+        super().__init__(username, password, account_url, api_url)
+        self._async_session = session
+
+    def set_session(self, session: aiohttp.ClientSession):
+        self._async_session = session
+
+    def _get_async_session(self) -> aiohttp.ClientSession:
+        if self._async_session is None or self._async_session.closed:
+            self._async_session = aiohttp.ClientSession(timeout=TIMEOUT)
+        return self._async_session
+
+    async def async_close(self):
+        if self._async_session is not None and not self._async_session.closed:
+            await self._async_session.close()
+        self._async_session = None
+
+    async def async_login_step_1(self) -> bool:
+        url = self._account_url + "/pass/serviceLogin?sid=xiaomiio&_json=true"
+        cookies = {
+            "userId": self._username
+        }
+        try:
+            async with self._get_async_session().get(url, headers=self._get_login_headers(), cookies=cookies,
+                                                     timeout=TIMEOUT) as response:
+                status, text = response.status, await response.text()
+        except:
+            return False
+        successful = status == 200 and "_sign" in self.to_json(text)
+        if successful:
+            self._sign = self.to_json(text)["_sign"]
+        return successful
+
+    async def async_login_step_2(self) -> Optional[bool]:
+        url = self._account_url + "/pass/serviceLoginAuth2"
+        try:
+            async with self._get_async_session().post(url, headers=self._get_login_headers(),
+                                                      params=self._get_login_fields(), timeout=TIMEOUT) as response:
+                status, text = response.status, await response.text()
+        except:
+            return False
+        if status != 200:
+            return False
+        return self._handle_login_step_2_response(text)
+
+    async def async_login_step_3(self) -> bool:
+        try:
+            async with self._get_async_session().get(self._location, headers=self._get_login_headers(),
+                                                     timeout=TIMEOUT) as response:
+                status, cookies = response.status, response.cookies
+        except:
+            return False
+        successful = status == 200 and "serviceToken" in cookies
+        if successful:
+            self._serviceToken = cookies["serviceToken"].value
+            self.auth_failed = False
+        return successful
+
+    async def async_login(self) -> Optional[bool]:
+        session = self._get_async_session()
+        session.cookie_jar.clear()
+        self._agent = self.generate_agent()
+        self._device_id = self.generate_device_id()
+        for domain in ["mi.com", "xiaomi.com"]:
+            cookies = SimpleCookie()
+            for name, value in [("sdkVersion", "accountsdk-18.8.15"), ("deviceId", self._device_id)]:
+                cookies[name] = value
+                cookies[name]["domain"] = domain
+            session.cookie_jar.update_cookies(cookies, URL(f"https://{domain}/"))
+        return await self.async_login_step_1() and await self.async_login_step_2() and await self.async_login_step_3()
+
+    async def async_get_raw_map_data(self, map_url: Optional[str]) -> Optional[bytes]:
+        if map_url is not None:
+            try:
+                async with self._get_async_session().get(map_url, timeout=TIMEOUT) as response:
+                    if response.status == 200:
+                        return await response.read()
+            except:
+                pass
+        return None
+
+    async def async_get_homes_iter(self, country: str) -> AsyncIterator[XiaomiHome]:
+        url = self.get_api_url(country) + "/v2/homeroom/gethome"
+        params = {
+            "data": json.dumps(
+                {
+                    "fg": True,
+                    "fetch_share": True,
+                    "fetch_share_dev": True,
+                    "limit": 300,
+                    "app_ver": 7,
+                }
+            )
+        }
+
+        if (response := await self.async_execute_api_call_encrypted(url, params)) is None:
+            return
+
+        if homelist := response["result"]["homelist"]:
+            for home in homelist:
+                yield XiaomiHome(int(home["id"]), home["uid"])
+
+        if homelist := response["result"]["share_home_list"]:
+            for home in homelist:
+                yield XiaomiHome(int(home["id"]), home["uid"])
+
+    async def async_get_devices_from_home_iter(self, country: str, home_id: int,
+                                               owner_id: int) -> AsyncIterator[XiaomiDeviceInfo]:
+        url = self.get_api_url(country) + "/v2/home/home_device_list"
+        params = {
+            "data": json.dumps(
+                {
+                    "home_id": home_id,
+                    "home_owner": owner_id,
+                    "limit": 200,
+                    "get_split_device": True,
+                    "support_smart_home": True,
+                }
+            )
+        }
+        if (response := await self.async_execute_api_call_encrypted(url, params)) is None:
+            return
+
+        if (raw_devices := response["result"]["device_info"]) is None:
+            return
+
+        for device in raw_devices:
+            yield XiaomiDeviceInfo(
+                device_id=device["did"],
+                name=device["name"],
+                model=device["model"],
+                token=device["token"],
+                country=country,
+                user_id=owner_id,
+                home_id=home_id,
+                mac=device.get("mac"),
+            )
+
+    async def async_get_devices_iter(self, country: Optional[str] = None) -> AsyncIterator[XiaomiDeviceInfo]:
+        countries_to_check = CONF_AVAILABLE_COUNTRIES if country is None else [country]
+        for _country in countries_to_check:
+            async for home in self.async_get_homes_iter(_country):
+                async for device in self.async_get_devices_from_home_iter(_country, home.homeid, home.owner):
+                    yield device
+
+    async def async_get_device_details_from_home(self, token: str, country: Optional[str] = None) -> DeviceDetails:
+        async for device in self.async_get_devices_iter(country):
+            if device.token == token:
+                return device.country, device.user_id, device.device_id, device.model, device.mac
+        return None, None, None, None, None
+
+    async def async_get_device_details_from_device_list(self, token: str, country: str) -> DeviceDetails:
+        devices = await self.async_get_devices(country)
+        if devices is not None:
+            found = list(filter(lambda d: str(d["token"]).casefold() == str(token).casefold(),
+                                devices["result"]["list"]))
+            if len(found) > 0:
+                user_id = found[0]["uid"]
+                device_id = found[0]["did"]
+                model = found[0]["model"]
+                mac = found[0]["mac"]
+                return country, user_id, device_id, model, mac
+        return None, None, None, None, None
+
+    async def async_get_device_details(self, token: str, country: Optional[str]) -> DeviceDetails:
+        countries_to_check = CONF_AVAILABLE_COUNTRIES
+        if country is not None:
+            countries_to_check = [country]
+        for find_device in [self.async_get_device_details_from_device_list, self.async_get_device_details_from_home]:
+            details = await self.async_probe_countries(partial(find_device, token), countries_to_check)
+            if details[3] is not None:
+                return details
+        return None, None, None, None, None
+
+    async def async_probe_countries(self, find_device: Callable[[str], Awaitable[DeviceDetails]],
+                                    countries: List[str]) -> DeviceDetails:
+        """
+        Searches all countries concurrently and returns the device found in the first country of the list.
+        Remaining searches are cancelled once device is found.
+        Each search records its own authentication result (see probe_countries).
+        """
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_COUNTRY_PROBES)
+
+        async def probe(country: str) -> Tuple[DeviceDetails, bool]:
+            async with semaphore:
+                # tasks run in copies of the current context, so each probe has its own result
+                PROBE_AUTH_FAILED.set(False)
+                return await find_device(country), PROBE_AUTH_FAILED.get()
+
+        tasks = [asyncio.ensure_future(probe(c)) for c in countries]
+        try:
+            auth_failed = False
+            for task in tasks:
+                try:
+                    details, probe_auth_failed = await task
+                except Exception:
+                    continue
+                if details[3] is not None:
+                    self.auth_failed = probe_auth_failed
+                    return details
+                auth_failed = auth_failed or probe_auth_failed
+            self.auth_failed = auth_failed
+            return None, None, None, None, None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def async_get_devices(self, country: str) -> Any:
+        url = self.get_api_url(country) + "/home/device_list"
+        params = {
+            "data": '{"getVirtualModel":false,"getHuamiDevices":0}'
+        }
+        return await self.async_execute_api_call_encrypted(url, params)
+
+    async def async_execute_api_call_encrypted(self, url: str, params: Dict[str, str]) -> Any:
+        fields = self._get_encrypted_call_fields(url, params)
+        try:
+            async with self._get_async_session().post(url, headers=self._get_api_call_headers(),
+                                                      cookies=self._get_api_call_cookies(), params=fields,
+                                                      timeout=TIMEOUT) as response:
+                status, text = response.status, await response.text()
+        except:
+            self._set_auth_failed(False)
+            return None
+        self._set_auth_failed(status in [401, 403])
+        if status == 200:
+            return self._decode_encrypted_response(fields, text)
+        return None
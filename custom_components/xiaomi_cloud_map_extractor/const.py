@@ -8,17 +8,30 @@ CONF_AVAILABLE_API_ROIDMI = "roidmi"
 CONF_AVAILABLE_API_VIOMI = "viomi"
 CONF_AVAILABLE_API_XIAOMI = "xiaomi"
 CONF_AVAILABLE_API_IJAI = "ijai"
+CONF_AVAILABLE_FORMAT_JPEG = "jpeg"
+CONF_AVAILABLE_FORMAT_PNG = "png"
+CONF_AVAILABLE_FORMAT_WEBP = "webp"
+CONF_AVAILABLE_RENDER_BACKEND_PROCESS = "process"
+CONF_AVAILABLE_RENDER_BACKEND_THREAD = "thread"
 CONF_AVAILABLE_COUNTRIES = ["cn", "de", "us", "ru", "tw", "sg", "in", "i2"]
 CONF_BOTTOM = "bottom"
 CONF_COLOR = "color"
 CONF_COLORS = "colors"
+CONF_COMPRESS_LEVEL = "compress_level"
 CONF_COUNTRY = "country"
 CONF_DRAW = "draw"
 CONF_FORCE_API = "force_api"
+CONF_FORMAT = "format"
 CONF_FONT = "font"
 CONF_FONT_SIZE = "font_size"
+CONF_IDLE_SCAN_INTERVAL = "idle_scan_interval"
+CONF_IMAGE_OUTPUT = "image_output"
 CONF_LEFT = "left"
+CONF_LOSSLESS = "lossless"
 CONF_MAP_TRANSFORM = "map_transformation"
+CONF_QUALITY = "quality"
+CONF_QUANTIZE = "quantize"
+CONF_RENDER_BACKEND = "render_backend"
 CONF_RIGHT = "right"
 CONF_ROOM_COLORS = "room_colors"
 CONF_ROTATE = "rotate"
@@ -45,6 +58,10 @@ CONF_Y = "y"
 CONF_AVAILABLE_APIS = [CONF_AVAILABLE_API_XIAOMI, CONF_AVAILABLE_API_VIOMI, CONF_AVAILABLE_API_ROIDMI,
                        CONF_AVAILABLE_API_DREAME, CONF_AVAILABLE_API_IJAI]
 
+CONF_AVAILABLE_FORMATS = [CONF_AVAILABLE_FORMAT_PNG, CONF_AVAILABLE_FORMAT_WEBP, CONF_AVAILABLE_FORMAT_JPEG]
+
+CONF_AVAILABLE_RENDER_BACKENDS = [CONF_AVAILABLE_RENDER_BACKEND_THREAD, CONF_AVAILABLE_RENDER_BACKEND_PROCESS]
+
 CONF_AVAILABLE_SIZES = [CONF_SIZE_VACUUM_RADIUS, CONF_SIZE_PATH_WIDTH, CONF_SIZE_IGNORED_OBSTACLE_RADIUS,
                         CONF_SIZE_IGNORED_OBSTACLE_WITH_PHOTO_RADIUS, CONF_SIZE_MOP_PATH_WIDTH,
                         CONF_SIZE_OBSTACLE_RADIUS, CONF_SIZE_OBSTACLE_WITH_PHOTO_RADIUS,
@@ -53,6 +70,11 @@ CONF_AVAILABLE_SIZES = [CONF_SIZE_VACUUM_RADIUS, CONF_SIZE_PATH_WIDTH, CONF_SIZE
 MINIMAL_IMAGE_WIDTH = 20
 MINIMAL_IMAGE_HEIGHT = 20
 CONTENT_TYPE = "image/png"
+OUTPUT_CONTENT_TYPES = {
+    CONF_AVAILABLE_FORMAT_PNG: CONTENT_TYPE,
+    CONF_AVAILABLE_FORMAT_WEBP: "image/webp",
+    CONF_AVAILABLE_FORMAT_JPEG: "image/jpeg"
+}
 DEFAULT_NAME = "Xiaomi Cloud Map Extractor"
 
 ATTRIBUTE_CALIBRATION = "calibration_points"
@@ -60,6 +82,8 @@ ATTRIBUTE_CARPET_MAP = "carpet_map"
 ATTRIBUTE_CHARGER = "charger"
 ATTRIBUTE_CLEANED_ROOMS = "cleaned_rooms"
 ATTRIBUTE_COUNTRY = "country"
+ATTRIBUTE_ENCODE_TIME = "encode_time"
+ATTRIBUTE_ENCODED_SIZE = "encoded_size"
 ATTRIBUTE_GOTO = "goto"
 ATTRIBUTE_GOTO_PATH = "goto_path"
 ATTRIBUTE_GOTO_PREDICTED_PATH = "goto_predicted_path"
@@ -67,6 +91,8 @@ ATTRIBUTE_IGNORED_OBSTACLES = "ignored_obstacles"
 ATTRIBUTE_IGNORED_OBSTACLES_WITH_PHOTO = "ignored_obstacles_with_photo"
 ATTRIBUTE_IMAGE = "image"
 ATTRIBUTE_IS_EMPTY = "is_empty"
+ATTRIBUTE_MAP_CACHE_HITS = "map_cache_hits"
+ATTRIBUTE_MAP_CACHE_MISSES = "map_cache_misses"
 ATTRIBUTE_MAP_NAME = "map_name"
 ATTRIBUTE_MOP_PATH = "mop_path"
 ATTRIBUTE_MAP_SAVED = "map_saved"
@@ -85,10 +111,12 @@ ATTRIBUTE_WALLS = "walls"
 ATTRIBUTE_ZONES = "zones"
 
 CONF_AVAILABLE_ATTRIBUTES = [ATTRIBUTE_CALIBRATION, ATTRIBUTE_CARPET_MAP, ATTRIBUTE_NO_CARPET_AREAS,
-                             ATTRIBUTE_CHARGER, ATTRIBUTE_CLEANED_ROOMS, ATTRIBUTE_COUNTRY,
+                             ATTRIBUTE_CHARGER, ATTRIBUTE_CLEANED_ROOMS, ATTRIBUTE_COUNTRY, ATTRIBUTE_ENCODE_TIME,
+                             ATTRIBUTE_ENCODED_SIZE,
                              ATTRIBUTE_GOTO, ATTRIBUTE_GOTO_PATH, ATTRIBUTE_GOTO_PREDICTED_PATH,
                              ATTRIBUTE_IGNORED_OBSTACLES, ATTRIBUTE_IGNORED_OBSTACLES_WITH_PHOTO, ATTRIBUTE_IMAGE,
-                             ATTRIBUTE_IS_EMPTY, ATTRIBUTE_MAP_NAME, ATTRIBUTE_MOP_PATH, ATTRIBUTE_NO_GO_AREAS,
+                             ATTRIBUTE_IS_EMPTY, ATTRIBUTE_MAP_CACHE_HITS, ATTRIBUTE_MAP_CACHE_MISSES,
+                             ATTRIBUTE_MAP_NAME, ATTRIBUTE_MOP_PATH, ATTRIBUTE_NO_GO_AREAS,
                              ATTRIBUTE_NO_MOPPING_AREAS, ATTRIBUTE_OBSTACLES, ATTRIBUTE_OBSTACLES_WITH_PHOTO,
                              ATTRIBUTE_PATH, ATTRIBUTE_ROOMS, ATTRIBUTE_ROOM_NUMBERS, ATTRIBUTE_VACUUM_POSITION,
                              ATTRIBUTE_VACUUM_ROOM, ATTRIBUTE_VACUUM_ROOM_NAME, ATTRIBUTE_WALLS, ATTRIBUTE_ZONES]
@@ -107,6 +135,7 @@ ATTR_PHOTO_NAME = "photo_name"
 ATTR_POINT_LENGTH = "point_length"
 ATTR_POINT_SIZE = "point_size"
 ATTR_ROTATION = "rotation"
+ATTR_RUNS = "runs"
 ATTR_SCALE = "scale"
 ATTR_SIZE = "size"
 ATTR_TWO_FACTOR_AUTH = "url_2fa"
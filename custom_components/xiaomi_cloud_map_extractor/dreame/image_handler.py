@@ -2,11 +2,11 @@ import logging
 from enum import IntEnum
 from typing import Dict, Tuple
 
+import numpy as np
 from PIL import Image
 from PIL.Image import Image as ImageType
 
-from custom_components.xiaomi_cloud_map_extractor.common.image_handler import ImageHandler
-from custom_components.xiaomi_cloud_map_extractor.common.map_data import Room
+from custom_components.xiaomi_cloud_map_extractor.common.image_handler import ImageHandler, RoomBounds
 from custom_components.xiaomi_cloud_map_extractor.const import \
     CONF_SCALE, CONF_TRIM, CONF_LEFT, CONF_RIGHT, CONF_TOP, CONF_BOTTOM, \
     COLOR_MAP_OUTSIDE, COLOR_MAP_INSIDE, COLOR_MAP_WALL, COLOR_ROOM_PREFIX
@@ -21,7 +21,7 @@ class ImageHandlerDreame(ImageHandler):
         WALL = 2
 
     @staticmethod
-    def parse(raw_data: bytes, header, colors, image_config, map_data_type: str) -> Tuple[ImageType, Dict[int, Room]]:
+    def parse(raw_data: bytes, header, colors, image_config, map_data_type: str) -> Tuple[ImageType, Dict[int, RoomBounds]]:
         scale = image_config[CONF_SCALE]
         trim_left = int(image_config[CONF_TRIM][CONF_LEFT] * header.image_width / 100)
         trim_right = int(image_config[CONF_TRIM][CONF_RIGHT] * header.image_width / 100)
@@ -29,58 +29,63 @@ class ImageHandlerDreame(ImageHandler):
         trim_bottom = int(image_config[CONF_TRIM][CONF_BOTTOM] * header.image_height / 100)
         trimmed_height = header.image_height - trim_top - trim_bottom
         trimmed_width = header.image_width - trim_left - trim_right
-        image = Image.new('RGBA', (trimmed_width, trimmed_height))
         if header.image_width == 0 or header.image_height == 0:
             return ImageHandler.create_empty_map_image(colors), {}
-        pixels = image.load()
-        rooms = {}
-
-        for img_y in range(trimmed_height):
-            for img_x in range(trimmed_width):
-                x = img_x
-                y = trimmed_height - img_y - 1
-                room_x = img_x + trim_left
-                room_y = img_y + trim_bottom
+        pixel_types = np.frombuffer(raw_data, dtype=np.uint8, count=header.image_width * header.image_height)
+        pixel_types = pixel_types.reshape(header.image_height, header.image_width)
+        pixel_types = pixel_types[trim_bottom:header.image_height - trim_top,
+                                  trim_left:header.image_width - trim_right]
+        palette, index_lut = ImageHandler.get_palette(ImageHandlerDreame.__get_color_lut__(colors, map_data_type))
+        # map rows are stored bottom-up, image rows are drawn top-down
+        image = ImageHandler.create_palette_image(index_lut[pixel_types[::-1]], palette)
+        if map_data_type == "regular":
+            is_unhandled = ((pixel_types >> 2 == 0) | (pixel_types >> 2 >= 62)) & (pixel_types & 0b00000011 == 3)
+            for px in np.unique(pixel_types[is_unhandled]):
+                _LOGGER.warning(f'unhandled pixel type: {px}')
+        room_numbers = ImageHandlerDreame.get_room_numbers(pixel_types, map_data_type)
+        rooms = ImageHandler.get_rooms_bounds(room_numbers, trim_left, trim_bottom)
+        if image_config["scale"] != 1 and header.image_width != 0 and header.image_height != 0:
+            image = image.resize((int(trimmed_width * scale), int(trimmed_height * scale)), resample=Image.NEAREST)
+        return image, rooms
 
-                # TODO : use MapDataParserDreame.MapDataTypes enum
-                if map_data_type == "regular":
-                    px = raw_data[img_x + trim_left + header.image_width * (img_y + trim_bottom)]
-                    segment_id = px >> 2
-                    if 0 < segment_id < 62:
-                        if segment_id not in rooms:
-                            rooms[segment_id] = Room(segment_id, room_x, room_y, room_x, room_y)
-                        rooms[segment_id] = Room(segment_id,
-                                                 min(rooms[segment_id].x0, room_x), min(rooms[segment_id].y0, room_y),
-                                                 max(rooms[segment_id].x1, room_x), max(rooms[segment_id].y1, room_y))
-                        default = ImageHandler.ROOM_COLORS[segment_id >> 1]
-                        pixels[x, y] = ImageHandler.__get_color__(f"{COLOR_ROOM_PREFIX}{segment_id}", colors, default)
-                    else:
-                        masked_px = px & 0b00000011
+    @staticmethod
+    def __get_color_lut__(colors, map_data_type: str) -> np.ndarray:
+        # pixels that are not drawn stay transparent
+        lut = np.zeros((256, 4), dtype=np.uint8)
+        for px in range(256):
+            # TODO : use MapDataParserDreame.MapDataTypes enum
+            if map_data_type == "regular":
+                segment_id = px >> 2
+                if 0 < segment_id < 62:
+                    default = ImageHandler.ROOM_COLORS[(segment_id >> 1) % len(ImageHandler.ROOM_COLORS)]
+                    lut[px] = ImageHandler.__get_rgba_color__(f"{COLOR_ROOM_PREFIX}{segment_id}", colors, default)
+                else:
+                    masked_px = px & 0b00000011
 
-                        if masked_px == ImageHandlerDreame.PixelTypes.NONE:
-                            pixels[x, y] = ImageHandler.__get_color__(COLOR_MAP_OUTSIDE, colors)
-                        elif masked_px == ImageHandlerDreame.PixelTypes.FLOOR:
-                            pixels[x, y] = ImageHandler.__get_color__(COLOR_MAP_INSIDE, colors)
-                        elif masked_px == ImageHandlerDreame.PixelTypes.WALL:
-                            pixels[x, y] = ImageHandler.__get_color__(COLOR_MAP_WALL, colors)
-                        else:
-                            _LOGGER.warning(f'unhandled pixel type: {px}')
-                elif map_data_type == "rism":
-                    px = raw_data[img_x + trim_left + header.image_width * (img_y + trim_bottom)]
-                    segment_id = px & 0b01111111
-                    wall_flag = px >> 7
+                    if masked_px == ImageHandlerDreame.PixelTypes.NONE:
+                        lut[px] = ImageHandler.__get_rgba_color__(COLOR_MAP_OUTSIDE, colors)
+                    elif masked_px == ImageHandlerDreame.PixelTypes.FLOOR:
+                        lut[px] = ImageHandler.__get_rgba_color__(COLOR_MAP_INSIDE, colors)
+                    elif masked_px == ImageHandlerDreame.PixelTypes.WALL:
+                        lut[px] = ImageHandler.__get_rgba_color__(COLOR_MAP_WALL, colors)
+            elif map_data_type == "rism":
+                segment_id = px & 0b01111111
+                wall_flag = px >> 7
 
-                    if wall_flag:
-                        pixels[x, y] = ImageHandler.__get_color__(COLOR_MAP_WALL, colors)
-                    elif segment_id > 0:
-                        if segment_id not in rooms:
-                            rooms[segment_id] = Room(segment_id, room_x, room_y, room_x, room_y)
-                        rooms[segment_id] = Room(segment_id,
-                                                 min(rooms[segment_id].x0, room_x), min(rooms[segment_id].y0, room_y),
-                                                 max(rooms[segment_id].x1, room_x), max(rooms[segment_id].y1, room_y))
-                        default = ImageHandler.ROOM_COLORS[segment_id >> 1]
-                        pixels[x, y] = ImageHandler.__get_color__(f"{COLOR_ROOM_PREFIX}{segment_id}", colors, default)
+                if wall_flag:
+                    lut[px] = ImageHandler.__get_rgba_color__(COLOR_MAP_WALL, colors)
+                elif segment_id > 0:
+                    default = ImageHandler.ROOM_COLORS[(segment_id >> 1) % len(ImageHandler.ROOM_COLORS)]
+                    lut[px] = ImageHandler.__get_rgba_color__(f"{COLOR_ROOM_PREFIX}{segment_id}", colors, default)
+        return lut
 
-        if image_config["scale"] != 1 and header.image_width != 0 and header.image_height != 0:
-            image = image.resize((int(trimmed_width * scale), int(trimmed_height * scale)), resample=Image.NEAREST)
-        return image, rooms
+    @staticmethod
+    def get_room_numbers(pixel_types: np.ndarray, map_data_type: str) -> np.ndarray:
+        pixel_types = pixel_types.astype(np.int16)
+        if map_data_type == "regular":
+            segment_ids = pixel_types >> 2
+            return np.where((segment_ids > 0) & (segment_ids < 62), segment_ids, -1)
+        if map_data_type == "rism":
+            segment_ids = pixel_types & 0b01111111
+            return np.where(((pixel_types >> 7) == 0) & (segment_ids > 0), segment_ids, -1)
+        return np.full(pixel_types.shape, -1, dtype=np.int16)
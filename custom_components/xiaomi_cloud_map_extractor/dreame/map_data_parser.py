@@ -6,6 +6,8 @@ import zlib
 from enum import Enum, IntEnum
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+
 from custom_components.xiaomi_cloud_map_extractor.common.map_data import Area, ImageData, MapData, Path, Point, Room, \
     Wall
 from custom_components.xiaomi_cloud_map_extractor.common.map_data_parser import MapDataParser
@@ -30,6 +32,8 @@ class MapDataHeader:
 class MapDataParserDreame(MapDataParser):
     HEADER_SIZE = 27
     PATH_REGEX = r'(?P<operator>[SL])(?P<x>-?\d+),(?P<y>-?\d+)'
+    VALID_PATH_REGEX = re.compile(r'(?:[SL]-?[0-9]+,-?[0-9]+)*')
+    PATH_SEPARATORS = str.maketrans("SL,", "   ")
 
     class PathOperators(str, Enum):
         START = "S"
@@ -47,10 +51,14 @@ class MapDataParserDreame(MapDataParser):
     def decode_map(raw_map: str, colors, drawables, texts, sizes, image_config,
                    map_data_type=MapDataTypes.REGULAR) -> MapData:
         _LOGGER.debug(f'decoding {map_data_type} type map')
-        raw_map_string = raw_map.replace('_', '/').replace('-', '+')
-        unzipped = zlib.decompress(base64.decodebytes(raw_map_string.encode("utf8")))
+        unzipped = MapDataParserDreame.unpack_map(raw_map)
         return MapDataParserDreame.parse(unzipped, colors, drawables, texts, sizes, image_config, map_data_type)
 
+    @staticmethod
+    def unpack_map(raw_map: str) -> bytes:
+        raw_map_string = raw_map.replace('_', '/').replace('-', '+')
+        return zlib.decompress(base64.decodebytes(raw_map_string.encode("utf8")))
+
     @staticmethod
     def parse(raw: bytes, colors, drawables, texts, sizes, image_config,
               map_data_type: MapDataTypes = MapDataTypes.REGULAR, *args, **kwargs) -> Optional[MapData]:
@@ -176,7 +184,8 @@ class MapDataParserDreame(MapDataParser):
             header.image_width,
             image_config,
             image,
-            lambda p: MapDataParserDreame.map_to_image(p, header.image_pixel_size)
+            lambda p: MapDataParserDreame.map_to_image(p, header.image_pixel_size),
+            img_transformation_array=lambda xy: MapDataParserDreame.map_to_image_array(xy, header.image_pixel_size)
         ), rooms
 
     @staticmethod
@@ -186,8 +195,32 @@ class MapDataParserDreame(MapDataParser):
             p.y / image_pixel_size
         )
 
+    @staticmethod
+    def map_to_image_array(xy: np.ndarray, image_pixel_size: int) -> np.ndarray:
+        return xy / image_pixel_size
+
     @staticmethod
     def parse_path(path_string: str) -> Path:
+        if MapDataParserDreame.VALID_PATH_REGEX.fullmatch(path_string) is None:
+            # tokenizer below handles only well-formed paths
+            return MapDataParserDreame.__parse_path_matches__(path_string)
+        operators = np.frombuffer(path_string.encode("ascii"), dtype=np.uint8)
+        operators = operators[(operators == ord("S")) | (operators == ord("L"))]
+        values = np.array(path_string.translate(MapDataParserDreame.PATH_SEPARATORS).split(), dtype=np.int64)
+        values = values.reshape(-1, 2)
+        starts = np.flatnonzero(operators == ord(MapDataParserDreame.PathOperators.START.value))
+        if len(starts) == 0:
+            return Path(None, None, None, [])
+        # lines before the first start do not belong to any path
+        values = values[starts[0]:]
+        starts = starts - starts[0]
+        # start points are absolute, line points are relative to the previous point of the same path
+        totals = np.cumsum(values, axis=0)
+        offsets = np.repeat(totals[starts] - values[starts], np.diff(starts, append=len(values)), axis=0)
+        return Path.from_array(None, None, None, totals - offsets, np.append(starts, len(values)))
+
+    @staticmethod
+    def __parse_path_matches__(path_string: str) -> Path:
         r = re.compile(MapDataParserDreame.PATH_REGEX)
         matches = [m.groupdict() for m in r.finditer(path_string)]
 
@@ -13,12 +13,15 @@ class DreameVacuum(XiaomiCloudVacuumV2):
     def get_map_archive_extension(self) -> str:
         return "b64"
 
-    def decode_map(self,
-                   raw_map: bytes,
-                   colors: Colors,
-                   drawables: Drawables,
-                   texts: Texts,
-                   sizes: Sizes,
-                   image_config: ImageConfig) -> MapData:
-        raw_map_string = raw_map.decode()
-        return MapDataParserDreame.decode_map(raw_map_string, colors, drawables, texts, sizes, image_config)
+    @staticmethod
+    def unpack_map(raw_map: bytes) -> bytes:
+        return MapDataParserDreame.unpack_map(raw_map.decode())
+
+    @staticmethod
+    def parse_map(unpacked_map: bytes,
+                  colors: Colors,
+                  drawables: Drawables,
+                  texts: Texts,
+                  sizes: Sizes,
+                  image_config: ImageConfig) -> MapData:
+        return MapDataParserDreame.parse(unpacked_map, colors, drawables, texts, sizes, image_config)
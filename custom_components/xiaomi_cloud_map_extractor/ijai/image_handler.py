@@ -2,11 +2,12 @@
 
 import logging
 
+import numpy as np
 from PIL import Image
 from PIL.Image import Image as ImageType
 from PIL.Image import Resampling
 
-from custom_components.xiaomi_cloud_map_extractor.common.image_handler import ImageHandler
+from custom_components.xiaomi_cloud_map_extractor.common.image_handler import ImageHandler, RoomBounds
 from custom_components.xiaomi_cloud_map_extractor.const import *
 from custom_components.xiaomi_cloud_map_extractor.types import Colors, ImageConfig
 
@@ -23,8 +24,8 @@ class ImageHandlerIjai(ImageHandler):
     MAP_SELECTED_ROOM_MAX = 109
 
     @staticmethod
-    def parse(map_data: bytes, width: int, height: int, colors: Colors, image_config: ImageConfig, draw_cleaned_area: bool
-    ) -> tuple[ImageType | None, dict[int, tuple[int, int, int, int]], set[int], ImageType | None]:
+    def parse(map_data: bytes, width: int, height: int, colors: Colors, image_config: ImageConfig,
+              draw_cleaned_area: bool) -> tuple[ImageType | None, dict[int, RoomBounds], set[int], ImageType | None]:
         rooms = {}
         cleaned_areas = set()
         _LOGGER.debug(f"ijai parser: image_config = {image_config}")
@@ -38,49 +39,28 @@ class ImageHandlerIjai(ImageHandler):
         if trimmed_width == 0 or trimmed_height == 0:
             return ImageHandler.create_empty_map_image(colors), rooms, cleaned_areas, None
 
-        image = Image.new('RGBA', (trimmed_width, trimmed_height))
-        pixels = image.load()
+        pixel_types = np.frombuffer(map_data, dtype=np.uint8, count=width * height).reshape(height, width)
+        pixel_types = pixel_types[trim_bottom:height - trim_top, trim_left:width - trim_right]
+        palette, index_lut = ImageHandler.get_palette(ImageHandlerIjai.__get_color_lut__(colors))
+        # map rows are stored bottom-up, image rows are drawn top-down
+        image = ImageHandler.create_palette_image(index_lut[pixel_types[::-1]], palette)
+        is_selected_room = (pixel_types >= ImageHandlerIjai.MAP_SELECTED_ROOM_MIN) & \
+                           (pixel_types <= ImageHandlerIjai.MAP_SELECTED_ROOM_MAX)
+        cleaned_areas = {int(p) - ImageHandlerIjai.MAP_SELECTED_ROOM_MIN + ImageHandlerIjai.MAP_ROOM_MIN
+                         for p in np.unique(pixel_types[is_selected_room])}
         cleaned_areas_layer = None
-        cleaned_areas_pixels = None
         if draw_cleaned_area:
-            cleaned_areas_layer = Image.new("RGBA", (trimmed_width, trimmed_height))
-            cleaned_areas_pixels = cleaned_areas_layer.load()
+            cleaned_areas_pixels = np.zeros((trimmed_height, trimmed_width, 4), dtype=np.uint8)
+            cleaned_areas_pixels[is_selected_room[::-1]] = \
+                ImageHandler.__get_rgba_color__(COLOR_CLEANED_AREA, colors)
+            cleaned_areas_layer = Image.fromarray(cleaned_areas_pixels, 'RGBA')
         _LOGGER.debug(f"trim_bottom = {trim_bottom}, trim_top = {trim_top}, trim_left = {trim_left}, trim_right = {trim_right}")
-        unknown_pixels = set()
-        for img_y in range(trimmed_height):
-            y = trimmed_height - 1 - img_y
-            for img_x in range(trimmed_width):
-                x = img_x
-                pixel_type = map_data[(img_y + trim_bottom)*width + x + trim_left]
-                if pixel_type == ImageHandlerIjai.MAP_OUTSIDE:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_MAP_OUTSIDE, colors)
-                elif pixel_type == ImageHandlerIjai.MAP_WALL:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_MAP_WALL_V2, colors)
-                elif pixel_type == ImageHandlerIjai.MAP_SCAN:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_SCAN, colors)
-                elif pixel_type == ImageHandlerIjai.MAP_NEW_DISCOVERED_AREA:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_NEW_DISCOVERED_AREA, colors)
-                elif ImageHandlerIjai.MAP_ROOM_MIN <= pixel_type <= ImageHandlerIjai.MAP_SELECTED_ROOM_MAX:
-                    room_x = img_x + trim_left
-                    room_y = img_y + trim_bottom
-                    room_number = pixel_type
-                    if pixel_type >= ImageHandlerIjai.MAP_SELECTED_ROOM_MIN:
-                        room_number = pixel_type - ImageHandlerIjai.MAP_SELECTED_ROOM_MIN + ImageHandlerIjai.MAP_ROOM_MIN
-                        cleaned_areas.add(room_number)
-                        if draw_cleaned_area:
-                            cleaned_areas_pixels[x, y] = ImageHandler.__get_color__(COLOR_CLEANED_AREA, colors)
-                    rooms[room_number] = (room_x, room_y, room_x, room_y) \
-                    if room_number not in rooms \
-                    else (min(rooms[room_number][0], room_x),
-                        min(rooms[room_number][1], room_y),
-                        max(rooms[room_number][2], room_x),
-                        max(rooms[room_number][3], room_y))
-                    default = ImageHandler.ROOM_COLORS[room_number % len(ImageHandler.ROOM_COLORS)]
-                    pixels[x, y] = ImageHandler.__get_color__(f"{COLOR_ROOM_PREFIX}{room_number}", colors, default)
-                else:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_UNKNOWN, colors)
-                    unknown_pixels.add(pixel_type)
-                    _LOGGER.debug(f"unknown pixel [{x},{y}] = {pixel_type}")
+        is_known = (pixel_types <= ImageHandlerIjai.MAP_NEW_DISCOVERED_AREA) | \
+                   (pixel_types == ImageHandlerIjai.MAP_WALL) | \
+                   ((pixel_types >= ImageHandlerIjai.MAP_ROOM_MIN) &
+                    (pixel_types <= ImageHandlerIjai.MAP_SELECTED_ROOM_MAX))
+        unknown_pixels = {int(p) for p in np.unique(pixel_types[~is_known])}
+        rooms = ImageHandler.get_rooms_bounds(ImageHandlerIjai.get_room_numbers(pixel_types), trim_left, trim_bottom)
         if image_config["scale"] != 1 and trimmed_width != 0 and trimmed_height != 0:
             image = image.resize((int(trimmed_width * scale), int(trimmed_height * scale)), resample=Resampling.NEAREST)
             if draw_cleaned_area:
@@ -89,3 +69,34 @@ class ImageHandlerIjai(ImageHandler):
         if len(unknown_pixels) > 0:
             _LOGGER.warning('unknown pixel_types: %s', unknown_pixels)
         return image, rooms, cleaned_areas, cleaned_areas_layer
+
+    @staticmethod
+    def __get_color_lut__(colors: Colors) -> np.ndarray:
+        lut = np.empty((256, 4), dtype=np.uint8)
+        for pixel_type in range(256):
+            if pixel_type == ImageHandlerIjai.MAP_OUTSIDE:
+                color = ImageHandler.__get_rgba_color__(COLOR_MAP_OUTSIDE, colors)
+            elif pixel_type == ImageHandlerIjai.MAP_WALL:
+                color = ImageHandler.__get_rgba_color__(COLOR_MAP_WALL_V2, colors)
+            elif pixel_type == ImageHandlerIjai.MAP_SCAN:
+                color = ImageHandler.__get_rgba_color__(COLOR_SCAN, colors)
+            elif pixel_type == ImageHandlerIjai.MAP_NEW_DISCOVERED_AREA:
+                color = ImageHandler.__get_rgba_color__(COLOR_NEW_DISCOVERED_AREA, colors)
+            elif ImageHandlerIjai.MAP_ROOM_MIN <= pixel_type <= ImageHandlerIjai.MAP_SELECTED_ROOM_MAX:
+                room_number = pixel_type
+                if pixel_type >= ImageHandlerIjai.MAP_SELECTED_ROOM_MIN:
+                    room_number = pixel_type - ImageHandlerIjai.MAP_SELECTED_ROOM_MIN + ImageHandlerIjai.MAP_ROOM_MIN
+                default = ImageHandler.ROOM_COLORS[room_number % len(ImageHandler.ROOM_COLORS)]
+                color = ImageHandler.__get_rgba_color__(f"{COLOR_ROOM_PREFIX}{room_number}", colors, default)
+            else:
+                color = ImageHandler.__get_rgba_color__(COLOR_UNKNOWN, colors)
+            lut[pixel_type] = color
+        return lut
+
+    @staticmethod
+    def get_room_numbers(pixel_types: np.ndarray) -> np.ndarray:
+        pixel_types = pixel_types.astype(np.int16)
+        room_numbers = np.where(pixel_types < ImageHandlerIjai.MAP_SELECTED_ROOM_MIN, pixel_types,
+                                pixel_types - ImageHandlerIjai.MAP_SELECTED_ROOM_MIN + ImageHandlerIjai.MAP_ROOM_MIN)
+        is_room = (pixel_types >= ImageHandlerIjai.MAP_ROOM_MIN) & (pixel_types <= ImageHandlerIjai.MAP_SELECTED_ROOM_MAX)
+        return np.where(is_room, room_numbers, -1)
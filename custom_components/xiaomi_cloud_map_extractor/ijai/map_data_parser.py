@@ -7,6 +7,8 @@ import sys
 import zlib
 from typing import Any
 
+import numpy as np
+
 import custom_components.xiaomi_cloud_map_extractor.ijai.RobotMap_pb2 as RobotMap
 from custom_components.xiaomi_cloud_map_extractor.common.map_data import *
 from custom_components.xiaomi_cloud_map_extractor.common.map_data import (
@@ -126,6 +128,7 @@ class MapDataParserIjai(MapDataParser):
                 image,
                 MapDataParserIjai.map_to_image,
                 additional_layers={DRAWABLE_CLEANED_AREA: cleaned_areas_layer},
+                img_transformation_array=MapDataParserIjai.map_to_image_array,
             ),
             rooms,
             cleaned_areas,
@@ -133,10 +136,10 @@ class MapDataParserIjai(MapDataParser):
 
     @staticmethod
     def parse_history() -> Path:
-        path_points = []
-        for pt in MapDataParserIjai.robot_map.historyPose.points:
-            path_points.append(Point(x = pt.x, y = pt.y))
-        return Path(len(path_points), 1, 0, [path_points])
+        history_points = MapDataParserIjai.robot_map.historyPose.points
+        path_points = np.fromiter((c for pt in history_points for c in (pt.x, pt.y)), dtype=np.float64,
+                                  count=2 * len(history_points))
+        return Path.from_array(len(history_points), 1, 0, path_points)
 
     @staticmethod
     def parse_restricted_areas(robot_map: RobotMap) -> tuple[list[Wall], list[Area]]:
@@ -194,6 +197,10 @@ class MapDataParserIjai(MapDataParser):
     def map_to_image(p: Point) -> Point:
         return Point(p.x * 20 + 400, p.y * 20 + 400)
 
+    @staticmethod
+    def map_to_image_array(xy: np.ndarray) -> np.ndarray:
+        return xy * 20 + 400
+
     @staticmethod
     def image_to_map(x: float) -> float:
         return (x - 400) / 20
\ No newline at end of file
@@ -32,24 +32,22 @@ class IjaiVacuum(XiaomiCloudVacuumV2):
     def map_data_parser(self) -> MapDataParserIjai:
         return self._ijai_map_data_parser
 
-    def get_map_url(self, map_name: str) -> str | None:
+    def get_map_url_request(self, map_name: str) -> tuple[str, dict[str, str]]:
         url = self._connector.get_api_url(self._country) + '/v2/home/get_interim_file_url_pro'
         params = {
             "data": f'{{"obj_name":"{self._user_id}/{self._device_id}/{map_name}"}}'
         }
-        api_response = self._connector.execute_api_call_encrypted(url, params)
+        return url, params
+
+    @staticmethod
+    def get_map_url_from_response(api_response) -> str | None:
         if api_response is None or ("result" not in api_response) or (api_response["result"] is None) or ("url" not in api_response["result"]):
-            self._LOGGER.debug(f"API returned {api_response['code']}" + "(" + api_response["message"] + ")")
+            if api_response is not None:
+                _LOGGER.debug(f"API returned {api_response.get('code')}" + "(" + str(api_response.get("message")) + ")")
             return None
         return api_response["result"]["url"]
 
-    def decode_map(self, 
-                   raw_map: bytes,
-                   colors: Colors,
-                   drawables: Drawables,
-                   texts: Texts,
-                   sizes: Sizes,
-                   image_config: ImageConfig) -> MapData:
+    def unpack_map(self, raw_map: bytes) -> bytes:
         GET_PROP_RETRIES=5
         if self._wifi_info_sn is None or self._wifi_info_sn == "":
             _LOGGER.debug(f"host={self._host}, token={self._token}")
@@ -63,11 +61,19 @@ class IjaiVacuum(XiaomiCloudVacuumV2):
                 except:
                     _LOGGER.warn("Failed to get wifi_sn from vacuum")
 
-        decoded_map = MapDataParserIjai.unpack_map(
+        return MapDataParserIjai.unpack_map(
             raw_map,
             wifi_sn=self._wifi_info_sn,
             owner_id=str(self._user_id),
             device_id=str(self._device_id),
             model=self.model,
             device_mac=self._mac)
-        return MapDataParserIjai.parse(decoded_map, colors, drawables, texts, sizes, image_config)
+
+    @staticmethod
+    def parse_map(unpacked_map: bytes,
+                  colors: Colors,
+                  drawables: Drawables,
+                  texts: Texts,
+                  sizes: Sizes,
+                  image_config: ImageConfig) -> MapData:
+        return MapDataParserIjai.parse(unpacked_map, colors, drawables, texts, sizes, image_config)
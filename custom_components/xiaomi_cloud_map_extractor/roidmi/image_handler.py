@@ -1,10 +1,11 @@
 import logging
 from typing import Dict, List, Tuple
 
+import numpy as np
 from PIL import Image
 from PIL.Image import Image as ImageType
 
-from custom_components.xiaomi_cloud_map_extractor.common.image_handler import ImageHandler
+from custom_components.xiaomi_cloud_map_extractor.common.image_handler import ImageHandler, RoomBounds
 from custom_components.xiaomi_cloud_map_extractor.const import *
 from custom_components.xiaomi_cloud_map_extractor.types import Colors, ImageConfig
 
@@ -19,7 +20,7 @@ class ImageHandlerRoidmi(ImageHandler):
     @staticmethod
     def parse(raw_data: bytes, width: int, height: int, colors: Colors, image_config: ImageConfig,
               room_numbers: List[int]) \
-            -> Tuple[ImageType, Dict[int, Tuple[int, int, int, int]]]:
+            -> Tuple[ImageType, Dict[int, RoomBounds]]:
         rooms = {}
         scale = image_config[CONF_SCALE]
         trim_left = int(image_config[CONF_TRIM][CONF_LEFT] * width / 100)
@@ -30,38 +31,37 @@ class ImageHandlerRoidmi(ImageHandler):
         trimmed_width = width - trim_left - trim_right
         if trimmed_width == 0 or trimmed_height == 0:
             return ImageHandler.create_empty_map_image(colors), rooms
-        image = Image.new('RGBA', (trimmed_width, trimmed_height))
-        pixels = image.load()
-        unknown_pixels = set()
-        for img_y in range(trimmed_height):
-            for img_x in range(trimmed_width):
-                pixel_type = raw_data[img_x + trim_left + width * (img_y + trim_bottom)]
-                x = img_x
-                y = trimmed_height - 1 - img_y
-                if pixel_type == ImageHandlerRoidmi.MAP_OUTSIDE:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_MAP_OUTSIDE, colors)
-                elif pixel_type == ImageHandlerRoidmi.MAP_WALL:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_MAP_WALL_V2, colors)
-                elif pixel_type == ImageHandlerRoidmi.MAP_UNKNOWN:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_UNKNOWN, colors)
-                elif pixel_type in room_numbers:
-                    room_x = img_x + trim_left
-                    room_y = img_y + trim_bottom
-                    room_number = pixel_type
-                    if room_number not in rooms:
-                        rooms[room_number] = (room_x, room_y, room_x, room_y)
-                    else:
-                        rooms[room_number] = (min(rooms[room_number][0], room_x),
-                                              min(rooms[room_number][1], room_y),
-                                              max(rooms[room_number][2], room_x),
-                                              max(rooms[room_number][3], room_y))
-                    default = ImageHandler.ROOM_COLORS[room_number % len(ImageHandler.ROOM_COLORS)]
-                    pixels[x, y] = ImageHandler.__get_color__(f"{COLOR_ROOM_PREFIX}{room_number}", colors, default)
-                else:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_UNKNOWN, colors)
-                    unknown_pixels.add(pixel_type)
+        pixel_types = np.frombuffer(raw_data, dtype=np.uint8, count=width * height).reshape(height, width)
+        pixel_types = pixel_types[trim_bottom:height - trim_top, trim_left:width - trim_right]
+        palette, index_lut = ImageHandler.get_palette(ImageHandlerRoidmi.__get_color_lut__(colors, room_numbers))
+        # map rows are stored bottom-up, image rows are drawn top-down
+        image = ImageHandler.create_palette_image(index_lut[pixel_types[::-1]], palette)
+        is_room = (np.isin(pixel_types, room_numbers) & (pixel_types != ImageHandlerRoidmi.MAP_OUTSIDE) &
+                   (pixel_types != ImageHandlerRoidmi.MAP_WALL) & (pixel_types != ImageHandlerRoidmi.MAP_UNKNOWN))
+        is_known = (is_room | (pixel_types == ImageHandlerRoidmi.MAP_OUTSIDE) |
+                    (pixel_types == ImageHandlerRoidmi.MAP_WALL) | (pixel_types == ImageHandlerRoidmi.MAP_UNKNOWN))
+        unknown_pixels = {int(p) for p in np.unique(pixel_types[~is_known])}
+        rooms = ImageHandler.get_rooms_bounds(np.where(is_room, pixel_types.astype(np.int16), -1), trim_left, trim_bottom)
         if image_config["scale"] != 1 and trimmed_width != 0 and trimmed_height != 0:
             image = image.resize((int(trimmed_width * scale), int(trimmed_height * scale)), resample=Image.NEAREST)
         if len(unknown_pixels) > 0:
             _LOGGER.warning('unknown pixel_types: %s', unknown_pixels)
         return image, rooms
+
+    @staticmethod
+    def __get_color_lut__(colors: Colors, room_numbers: List[int]) -> np.ndarray:
+        lut = np.empty((256, 4), dtype=np.uint8)
+        for pixel_type in range(256):
+            if pixel_type == ImageHandlerRoidmi.MAP_OUTSIDE:
+                color = ImageHandler.__get_rgba_color__(COLOR_MAP_OUTSIDE, colors)
+            elif pixel_type == ImageHandlerRoidmi.MAP_WALL:
+                color = ImageHandler.__get_rgba_color__(COLOR_MAP_WALL_V2, colors)
+            elif pixel_type == ImageHandlerRoidmi.MAP_UNKNOWN:
+                color = ImageHandler.__get_rgba_color__(COLOR_UNKNOWN, colors)
+            elif pixel_type in room_numbers:
+                default = ImageHandler.ROOM_COLORS[pixel_type % len(ImageHandler.ROOM_COLORS)]
+                color = ImageHandler.__get_rgba_color__(f"{COLOR_ROOM_PREFIX}{pixel_type}", colors, default)
+            else:
+                color = ImageHandler.__get_rgba_color__(COLOR_UNKNOWN, colors)
+            lut[pixel_type] = color
+        return lut
@@ -3,6 +3,8 @@ import logging
 import math
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+
 from custom_components.xiaomi_cloud_map_extractor.common.map_data import Area, ImageData, MapData, Path, Point, Room, \
     Wall
 from custom_components.xiaomi_cloud_map_extractor.common.map_data_parser import MapDataParser
@@ -59,6 +61,10 @@ class MapDataParserRoidmi(MapDataParser):
     def map_to_image(p: Point, resolution, min_x, min_y) -> Point:
         return Point(p.x / 1000 / resolution - min_x, p.y / 1000 / resolution - min_y)
 
+    @staticmethod
+    def map_to_image_array(xy: np.ndarray, resolution, min_x, min_y) -> np.ndarray:
+        return xy / 1000 / resolution - np.array([min_x, min_y])
+
     @staticmethod
     def image_to_map(p: Point, resolution, min_x, min_y) -> Point:
         return Point((p.x + min_x) * resolution * 1000, (p.y + min_y) * resolution * 1000)
@@ -79,17 +85,18 @@ class MapDataParserRoidmi(MapDataParser):
             rooms[number].x1 = p2.x
             rooms[number].y1 = p2.y
         return ImageData(width * height, image_top, image_left, height, width, image_config, image,
-                         lambda p: MapDataParserRoidmi.map_to_image(p, resolution, min_x, min_y))
+                         lambda p: MapDataParserRoidmi.map_to_image(p, resolution, min_x, min_y),
+                         img_transformation_array=lambda xy: MapDataParserRoidmi.map_to_image_array(
+                             xy, resolution, min_x, min_y))
 
     @staticmethod
     def parse_path(map_info: dict) -> Path:
-        path_points = []
+        path_points = np.empty((0, 2))
         if "posArray" in map_info:
             raw_points = json.loads(map_info["posArray"])
-            for raw_point in raw_points:
-                point = Point(raw_point[0], raw_point[1])
-                path_points.append(point)
-        return Path(None, None, None, [path_points])
+            if len(raw_points) > 0:
+                path_points = np.array([raw_point[:2] for raw_point in raw_points])
+        return Path.from_array(None, None, None, path_points)
 
     @staticmethod
     def parse_vacuum_position(map_info: dict) -> Point:
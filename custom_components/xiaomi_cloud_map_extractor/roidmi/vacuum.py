@@ -12,15 +12,18 @@ class RoidmiVacuum(XiaomiCloudVacuumV2):
     def __init__(self, connector: XiaomiCloudConnector, country: str, user_id: str, device_id: str, model: str):
         super().__init__(connector, country, user_id, device_id, model)
 
-    def decode_map(self,
-                   raw_map: bytes,
-                   colors: Colors,
-                   drawables: Drawables,
-                   texts: Texts,
-                   sizes: Sizes,
-                   image_config: ImageConfig) -> MapData:
-        unzipped = gzip.decompress(raw_map)
-        return MapDataParserRoidmi.parse(unzipped, colors, drawables, texts, sizes, image_config)
+    @staticmethod
+    def unpack_map(raw_map: bytes) -> bytes:
+        return gzip.decompress(raw_map)
+
+    @staticmethod
+    def parse_map(unpacked_map: bytes,
+                  colors: Colors,
+                  drawables: Drawables,
+                  texts: Texts,
+                  sizes: Sizes,
+                  image_config: ImageConfig) -> MapData:
+        return MapDataParserRoidmi.parse(unpacked_map, colors, drawables, texts, sizes, image_config)
 
     def get_map_archive_extension(self) -> str:
         return "gz"
@@ -1,10 +1,11 @@
 import logging
 from typing import Dict, Optional, Set, Tuple
 
+import numpy as np
 from PIL import Image
 from PIL.Image import Image as ImageType
 
-from custom_components.xiaomi_cloud_map_extractor.common.image_handler import ImageHandler
+from custom_components.xiaomi_cloud_map_extractor.common.image_handler import ImageHandler, RoomBounds
 from custom_components.xiaomi_cloud_map_extractor.const import *
 from custom_components.xiaomi_cloud_map_extractor.types import Colors, ImageConfig
 from custom_components.xiaomi_cloud_map_extractor.viomi.parsing_buffer import ParsingBuffer
@@ -25,7 +26,7 @@ class ImageHandlerViomi(ImageHandler):
     @staticmethod
     def parse(buf: ParsingBuffer, width: int, height: int, colors: Colors, image_config: ImageConfig,
               draw_cleaned_area: bool) \
-            -> Tuple[ImageType, Dict[int, Tuple[int, int, int, int]], Set[int], Optional[ImageType]]:
+            -> Tuple[ImageType, Dict[int, RoomBounds], Set[int], Optional[ImageType]]:
         rooms = {}
         cleaned_areas = set()
         scale = image_config[CONF_SCALE]
@@ -35,55 +36,30 @@ class ImageHandlerViomi(ImageHandler):
         trim_bottom = int(image_config[CONF_TRIM][CONF_BOTTOM] * height / 100)
         trimmed_height = height - trim_top - trim_bottom
         trimmed_width = width - trim_left - trim_right
+        pixel_types = np.frombuffer(buf.get_bytes_view('image', width * height), dtype=np.uint8)
         if trimmed_width == 0 or trimmed_height == 0:
             return ImageHandler.create_empty_map_image(colors), rooms, cleaned_areas, None
-        image = Image.new('RGBA', (trimmed_width, trimmed_height))
-        pixels = image.load()
+        pixel_types = pixel_types.reshape(height, width)[trim_bottom:height - trim_top, trim_left:width - trim_right]
+        # map rows are stored bottom-up, image rows are drawn top-down
+        palette, index_lut = ImageHandler.get_palette(ImageHandlerViomi.__get_color_lut__(colors))
+        image = ImageHandler.create_palette_image(index_lut[pixel_types[::-1]], palette)
+        is_selected_room = (pixel_types >= ImageHandlerViomi.MAP_SELECTED_ROOM_MIN) & \
+                           (pixel_types <= ImageHandlerViomi.MAP_SELECTED_ROOM_MAX)
+        cleaned_areas = {int(p) - ImageHandlerViomi.MAP_SELECTED_ROOM_MIN + ImageHandlerViomi.MAP_ROOM_MIN
+                         for p in np.unique(pixel_types[is_selected_room])}
         cleaned_areas_layer = None
-        cleaned_areas_pixels = None
         if draw_cleaned_area:
-            cleaned_areas_layer = Image.new('RGBA', (trimmed_width, trimmed_height))
-            cleaned_areas_pixels = cleaned_areas_layer.load()
-        buf.skip('trim_bottom', trim_bottom * width)
-        unknown_pixels = set()
-        for img_y in range(trimmed_height):
-            buf.skip('trim_left', trim_left)
-            for img_x in range(trimmed_width):
-                pixel_type = buf.get_uint8('pixel')
-                x = img_x
-                y = trimmed_height - 1 - img_y
-                if pixel_type == ImageHandlerViomi.MAP_OUTSIDE:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_MAP_OUTSIDE, colors)
-                elif pixel_type == ImageHandlerViomi.MAP_WALL:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_MAP_WALL_V2, colors)
-                elif pixel_type == ImageHandlerViomi.MAP_SCAN:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_SCAN, colors)
-                elif pixel_type == ImageHandlerViomi.MAP_NEW_DISCOVERED_AREA:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_NEW_DISCOVERED_AREA, colors)
-                elif ImageHandlerViomi.MAP_ROOM_MIN <= pixel_type <= ImageHandlerViomi.MAP_SELECTED_ROOM_MAX:
-                    room_x = img_x + trim_left
-                    room_y = img_y + trim_bottom
-                    if pixel_type < ImageHandlerViomi.MAP_SELECTED_ROOM_MIN:
-                        room_number = pixel_type
-                    else:
-                        room_number = pixel_type - ImageHandlerViomi.MAP_SELECTED_ROOM_MIN + ImageHandlerViomi.MAP_ROOM_MIN
-                        cleaned_areas.add(room_number)
-                        if draw_cleaned_area:
-                            cleaned_areas_pixels[x, y] = ImageHandler.__get_color__(COLOR_CLEANED_AREA, colors)
-                    if room_number not in rooms:
-                        rooms[room_number] = (room_x, room_y, room_x, room_y)
-                    else:
-                        rooms[room_number] = (min(rooms[room_number][0], room_x),
-                                              min(rooms[room_number][1], room_y),
-                                              max(rooms[room_number][2], room_x),
-                                              max(rooms[room_number][3], room_y))
-                    default = ImageHandler.ROOM_COLORS[room_number % len(ImageHandler.ROOM_COLORS)]
-                    pixels[x, y] = ImageHandler.__get_color__(f"{COLOR_ROOM_PREFIX}{room_number}", colors, default)
-                else:
-                    pixels[x, y] = ImageHandler.__get_color__(COLOR_UNKNOWN, colors)
-                    unknown_pixels.add(pixel_type)
-            buf.skip('trim_right', trim_right)
-        buf.skip('trim_top', trim_top * width)
+            cleaned_areas_pixels = np.zeros((trimmed_height, trimmed_width, 4), dtype=np.uint8)
+            cleaned_areas_pixels[is_selected_room[::-1]] = \
+                ImageHandler.__get_rgba_color__(COLOR_CLEANED_AREA, colors)
+            cleaned_areas_layer = Image.fromarray(cleaned_areas_pixels, 'RGBA')
+        is_known = (pixel_types <= ImageHandlerViomi.MAP_NEW_DISCOVERED_AREA) | \
+                   (pixel_types == ImageHandlerViomi.MAP_WALL) | \
+                   ((pixel_types >= ImageHandlerViomi.MAP_ROOM_MIN) &
+                    (pixel_types <= ImageHandlerViomi.MAP_SELECTED_ROOM_MAX))
+        unknown_pixels = {int(p) for p in np.unique(pixel_types[~is_known])}
+        rooms = ImageHandlerViomi.get_rooms_bounds(ImageHandlerViomi.get_room_numbers(pixel_types),
+                                                   trim_left, trim_bottom)
         if image_config["scale"] != 1 and trimmed_width != 0 and trimmed_height != 0:
             image = image.resize((int(trimmed_width * scale), int(trimmed_height * scale)), resample=Image.NEAREST)
             if draw_cleaned_area:
@@ -92,3 +68,35 @@ class ImageHandlerViomi(ImageHandler):
         if len(unknown_pixels) > 0:
             _LOGGER.warning('unknown pixel_types: %s', unknown_pixels)
         return image, rooms, cleaned_areas, cleaned_areas_layer
+
+    @staticmethod
+    def __get_color_lut__(colors: Colors) -> np.ndarray:
+        lut = np.empty((256, 4), dtype=np.uint8)
+        for pixel_type in range(256):
+            if pixel_type == ImageHandlerViomi.MAP_OUTSIDE:
+                color = ImageHandler.__get_rgba_color__(COLOR_MAP_OUTSIDE, colors)
+            elif pixel_type == ImageHandlerViomi.MAP_WALL:
+                color = ImageHandler.__get_rgba_color__(COLOR_MAP_WALL_V2, colors)
+            elif pixel_type == ImageHandlerViomi.MAP_SCAN:
+                color = ImageHandler.__get_rgba_color__(COLOR_SCAN, colors)
+            elif pixel_type == ImageHandlerViomi.MAP_NEW_DISCOVERED_AREA:
+                color = ImageHandler.__get_rgba_color__(COLOR_NEW_DISCOVERED_AREA, colors)
+            elif ImageHandlerViomi.MAP_ROOM_MIN <= pixel_type <= ImageHandlerViomi.MAP_SELECTED_ROOM_MAX:
+                room_number = pixel_type
+                if pixel_type >= ImageHandlerViomi.MAP_SELECTED_ROOM_MIN:
+                    room_number = pixel_type - ImageHandlerViomi.MAP_SELECTED_ROOM_MIN + ImageHandlerViomi.MAP_ROOM_MIN
+                default = ImageHandler.ROOM_COLORS[room_number % len(ImageHandler.ROOM_COLORS)]
+                color = ImageHandler.__get_rgba_color__(f"{COLOR_ROOM_PREFIX}{room_number}", colors, default)
+            else:
+                color = ImageHandler.__get_rgba_color__(COLOR_UNKNOWN, colors)
+            lut[pixel_type] = color
+        return lut
+
+    @staticmethod
+    def get_room_numbers(pixel_types: np.ndarray) -> np.ndarray:
+        pixel_types = pixel_types.astype(np.int16)
+        room_numbers = np.where(pixel_types < ImageHandlerViomi.MAP_SELECTED_ROOM_MIN, pixel_types,
+                                pixel_types - ImageHandlerViomi.MAP_SELECTED_ROOM_MIN + ImageHandlerViomi.MAP_ROOM_MIN)
+        is_room = (pixel_types >= ImageHandlerViomi.MAP_ROOM_MIN) & \
+                  (pixel_types <= ImageHandlerViomi.MAP_SELECTED_ROOM_MAX)
+        return np.where(is_room, room_numbers, -1)
@@ -2,6 +2,8 @@ import logging
 import math
 from typing import Dict, List, Optional, Set, Tuple
 
+import numpy as np
+
 from custom_components.xiaomi_cloud_map_extractor.common.map_data import Area, ImageData, MapData, Path, Point, Room, \
     Wall, Zone
 from custom_components.xiaomi_cloud_map_extractor.common.map_data_parser import MapDataParser
@@ -25,6 +27,7 @@ class MapDataParserViomi(MapDataParser):
     FEATURE_ROOMS = 0x00001000
 
     POSITION_UNKNOWN = 1100
+    HISTORY_RECORD = np.dtype([('mode', 'u1'), ('x', '<f4'), ('y', '<f4')])
 
     @staticmethod
     def parse(raw: bytes, colors: Colors, drawables: Drawables, texts: Texts, sizes: Sizes,
@@ -109,6 +112,10 @@ class MapDataParserViomi(MapDataParser):
     def map_to_image(p: Point) -> Point:
         return Point(p.x * 20 + 400, p.y * 20 + 400)
 
+    @staticmethod
+    def map_to_image_array(xy: np.ndarray) -> np.ndarray:
+        return xy * 20 + 400
+
     @staticmethod
     def image_to_map(x: float) -> float:
         return (x - 400) / 20
@@ -157,17 +164,20 @@ class MapDataParserViomi(MapDataParser):
                                  MapDataParserViomi.image_to_map(room[3] + image_top))
         return ImageData(image_size, image_top, image_left, image_height, image_width, image_config,
                          image, MapDataParserViomi.map_to_image,
-                         additional_layers={DRAWABLE_CLEANED_AREA: cleaned_areas_layer}), rooms, cleaned_areas
+                         additional_layers={DRAWABLE_CLEANED_AREA: cleaned_areas_layer},
+                         img_transformation_array=MapDataParserViomi.map_to_image_array), rooms, cleaned_areas
 
     @staticmethod
     def parse_history(buf: ParsingBuffer) -> Path:
-        path_points = []
         buf.skip('unknown1', 4)
         history_count = buf.get_uint32('history_count')
-        for _ in range(history_count):
-            mode = buf.get_uint8('mode')  # 0: taxi, 1: working
-            path_points.append(MapDataParserViomi.parse_position(buf, 'path'))
-        return Path(len(path_points), 1, 0, [path_points])
+        # mode - 0: taxi, 1: working
+        history = np.frombuffer(buf.get_bytes_view('path', history_count * MapDataParserViomi.HISTORY_RECORD.itemsize),
+                                dtype=MapDataParserViomi.HISTORY_RECORD)
+        known = (history['x'] != MapDataParserViomi.POSITION_UNKNOWN) & \
+                (history['y'] != MapDataParserViomi.POSITION_UNKNOWN)
+        path_points = np.column_stack((history['x'][known], history['y'][known]))
+        return Path.from_array(len(path_points), 1, 0, path_points)
 
     @staticmethod
     def parse_restricted_areas(buf: ParsingBuffer) -> Tuple[List[Wall], List[Area]]:
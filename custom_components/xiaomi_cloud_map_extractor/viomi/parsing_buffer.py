@@ -29,6 +29,13 @@ class ParsingBuffer:
         self._offs += n
         self._length -= n
 
+    def get_bytes_view(self, field: str, n: int) -> memoryview:
+        if self._length < n:
+            raise ValueError(f"error parsing {self._name}.{field} at offset {self._offs:#x}: buffer underrun")
+        self._offs += n
+        self._length -= n
+        return memoryview(self._data)[self._offs - n:self._offs]
+
     def get_uint8(self, field: str) -> int:
         if self._length < 1:
             raise ValueError(f"error parsing {self._name}.{field} at offset {self._offs:#x}: buffer underrun")
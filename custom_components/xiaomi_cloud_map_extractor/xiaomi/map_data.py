@@ -0,0 +1,44 @@
+from typing import Any, Callable, Dict
+
+from custom_components.xiaomi_cloud_map_extractor.common.map_data import MapData
+
+
+class MapDataXiaomi(MapData):
+    """
+    Map data which decodes blocks of a Xiaomi map only when their attributes are read,
+    either by drawables during rendering or by attributes of the camera.
+    """
+
+    def __init__(self, calibration_center: float = 0, calibration_diff: float = 0):
+        super().__init__(calibration_center, calibration_diff)
+        self._pending: Dict[str, Callable[[], Any]] = {}
+
+    def set_lazy(self, name: str, decode: Callable[[], Any]):
+        # removed default makes __getattr__ handle the first access
+        self.__dict__.pop(name, None)
+        self._pending[name] = decode
+
+    def decode_all(self):
+        for name in list(self._pending):
+            getattr(self, name)
+
+    def __getattr__(self, name: str) -> Any:
+        pending = self.__dict__.get("_pending")
+        if pending is None or name not in pending:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        # decoding is repeatable, so concurrent first accesses do not need a lock
+        value = pending[name]()
+        self.__dict__[name] = value
+        pending.pop(name, None)
+        return value
+
+    def __copy__(self) -> "MapDataXiaomi":
+        copied = MapDataXiaomi.__new__(MapDataXiaomi)
+        copied.__dict__.update(self.__dict__)
+        copied._pending = dict(self._pending)
+        return copied
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # decoders hold views of the raw map, which cannot be pickled
+        self.decode_all()
+        return super().__getstate__()
@@ -1,10 +1,15 @@
 import logging
-from typing import Tuple, List, Set
+from functools import partial
+from struct import Struct, unpack_from
+from typing import Any, Tuple, List, Optional
+
+import numpy as np
 
 from custom_components.xiaomi_cloud_map_extractor.common.map_data import *
 from custom_components.xiaomi_cloud_map_extractor.common.map_data_parser import MapDataParser
 from custom_components.xiaomi_cloud_map_extractor.types import Colors, Drawables, Sizes, Texts
 from custom_components.xiaomi_cloud_map_extractor.xiaomi.image_handler import ImageHandlerXiaomi
+from custom_components.xiaomi_cloud_map_extractor.xiaomi.map_data import MapDataXiaomi
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -31,6 +36,34 @@ class MapDataParserXiaomi(MapDataParser):
     NO_CARPET_AREAS = 19
     DIGEST = 1024
     SIZE = 1024
+    # type, header length, data length
+    BLOCK_HEADER = Struct("<HHI")
+    # top, left, height, width at the end of image block header
+    IMAGE_BOUNDS = Struct("<IIII")
+    # x0, y0, x1, y1 of walls and zones
+    LINE_RECORD = Struct("<HHHH")
+    # x0, y0, ..., x3, y3 of area corners
+    AREA_RECORD = Struct("<HHHHHHHH")
+    BLOCK_ATTRIBUTES = {
+        CHARGER: "charger",
+        PATH: "path",
+        GOTO_PATH: "goto_path",
+        GOTO_PREDICTED_PATH: "predicted_path",
+        CURRENTLY_CLEANED_ZONES: "zones",
+        GOTO_TARGET: "goto",
+        ROBOT_POSITION: "vacuum_position",
+        NO_GO_AREAS: "no_go_areas",
+        VIRTUAL_WALLS: "walls",
+        BLOCKS: "blocks",
+        NO_MOPPING_AREAS: "no_mopping_areas",
+        OBSTACLES: "obstacles",
+        IGNORED_OBSTACLES: "ignored_obstacles",
+        OBSTACLES_WITH_PHOTO: "obstacles_with_photo",
+        IGNORED_OBSTACLES_WITH_PHOTO: "ignored_obstacles_with_photo",
+        CARPET_MAP: "carpet_map",
+        MOP_PATH: "mop_path",
+        NO_CARPET_AREAS: "no_carpet_areas"
+    }
     KNOWN_OBSTACLE_TYPES = {
         0: 'cable',
         2: 'shoes',
@@ -43,79 +76,26 @@ class MapDataParserXiaomi(MapDataParser):
     @staticmethod
     def parse(raw: bytes, colors: Colors, drawables: Drawables, texts: Texts, sizes: Sizes,
               image_config: ImageConfig, *args, **kwargs) -> MapData:
-        map_data = MapData(25500, 1000)
-        map_header_length = MapDataParserXiaomi.get_int16(raw, 0x02)
-        map_data.major_version = MapDataParserXiaomi.get_int16(raw, 0x08)
-        map_data.minor_version = MapDataParserXiaomi.get_int16(raw, 0x0A)
-        map_data.map_index = MapDataParserXiaomi.get_int32(raw, 0x0C)
-        map_data.map_sequence = MapDataParserXiaomi.get_int32(raw, 0x10)
-        block_start_position = map_header_length
-        img_start = None
-        img_data = None
-        while block_start_position < len(raw):
-            block_header_length = MapDataParserXiaomi.get_int16(raw, block_start_position + 0x02)
-            header = MapDataParserXiaomi.get_bytes(raw, block_start_position, block_header_length)
-            block_type = MapDataParserXiaomi.get_int16(header, 0x00)
-            block_data_length = MapDataParserXiaomi.get_int32(header, 0x04)
-            block_data_start = block_start_position + block_header_length
-            data = MapDataParserXiaomi.get_bytes(raw, block_data_start, block_data_length)
-
-            if block_type == MapDataParserXiaomi.CHARGER:
-                map_data.charger = MapDataParserXiaomi.parse_object_position(block_data_length, data)
-            elif block_type == MapDataParserXiaomi.IMAGE:
-                img_start = block_start_position
-                img_data_length = block_data_length
-                img_header_length = block_header_length
-                img_data = data
-                img_header = header
-            elif block_type == MapDataParserXiaomi.ROBOT_POSITION:
-                map_data.vacuum_position = MapDataParserXiaomi.parse_object_position(block_data_length, data)
-            elif block_type == MapDataParserXiaomi.PATH:
-                map_data.path = MapDataParserXiaomi.parse_path(block_start_position, header, raw)
-            elif block_type == MapDataParserXiaomi.GOTO_PATH:
-                map_data.goto_path = MapDataParserXiaomi.parse_path(block_start_position, header, raw)
-            elif block_type == MapDataParserXiaomi.GOTO_PREDICTED_PATH:
-                map_data.predicted_path = MapDataParserXiaomi.parse_path(block_start_position, header, raw)
-            elif block_type == MapDataParserXiaomi.CURRENTLY_CLEANED_ZONES:
-                map_data.zones = MapDataParserXiaomi.parse_zones(data, header)
-            elif block_type == MapDataParserXiaomi.GOTO_TARGET:
-                map_data.goto = MapDataParserXiaomi.parse_goto_target(data)
+        map_data = MapDataXiaomi(25500, 1000)
+        raw = memoryview(raw)
+        map_data.major_version, map_data.minor_version, map_data.map_index, map_data.map_sequence = \
+            unpack_from("<HHII", raw, 0x08)
+        blocks = MapDataParserXiaomi.index_blocks(raw)
+        for block_type, (_, header, data) in blocks.items():
+            if block_type in MapDataParserXiaomi.BLOCK_ATTRIBUTES:
+                # blocks are decoded on first access, only by drawables and attributes that need them
+                map_data.set_lazy(MapDataParserXiaomi.BLOCK_ATTRIBUTES[block_type],
+                                  partial(MapDataParserXiaomi.decode_block, block_type, header, data, map_data))
             elif block_type == MapDataParserXiaomi.DIGEST:
                 map_data.is_valid = True
-            elif block_type == MapDataParserXiaomi.VIRTUAL_WALLS:
-                map_data.walls = MapDataParserXiaomi.parse_walls(data, header)
-            elif block_type == MapDataParserXiaomi.NO_GO_AREAS:
-                map_data.no_go_areas = MapDataParserXiaomi.parse_area(header, data)
-            elif block_type == MapDataParserXiaomi.NO_MOPPING_AREAS:
-                map_data.no_mopping_areas = MapDataParserXiaomi.parse_area(header, data)
-            elif block_type == MapDataParserXiaomi.OBSTACLES:
-                map_data.obstacles = MapDataParserXiaomi.parse_obstacles(data, header)
-            elif block_type == MapDataParserXiaomi.IGNORED_OBSTACLES:
-                map_data.ignored_obstacles = MapDataParserXiaomi.parse_obstacles(data, header)
-            elif block_type == MapDataParserXiaomi.OBSTACLES_WITH_PHOTO:
-                map_data.obstacles_with_photo = MapDataParserXiaomi.parse_obstacles(data, header)
-            elif block_type == MapDataParserXiaomi.IGNORED_OBSTACLES_WITH_PHOTO:
-                map_data.ignored_obstacles_with_photo = MapDataParserXiaomi.parse_obstacles(data, header)
-            elif block_type == MapDataParserXiaomi.BLOCKS:
-                block_pairs = MapDataParserXiaomi.get_int16(header, 0x08)
-                map_data.blocks = MapDataParserXiaomi.get_bytes(data, 0, block_pairs)
-            elif block_type == MapDataParserXiaomi.MOP_PATH:
-                points_mask = MapDataParserXiaomi.get_bytes(raw, block_data_start, block_data_length)
-                # only the map_data.path points where points_mask == 1 are in mop_path
-                map_data.mop_path = MapDataParserXiaomi.parse_mop_path(map_data.path, points_mask)
-            elif block_type == MapDataParserXiaomi.CARPET_MAP:
-                data = MapDataParserXiaomi.get_bytes(raw, block_data_start, block_data_length)
-                # only the indexes where value == 1 are in carpet_map
-                map_data.carpet_map = MapDataParserXiaomi.parse_carpet_map(data, image_config)
-            elif block_type == MapDataParserXiaomi.NO_CARPET_AREAS:
-                map_data.no_carpet_areas = MapDataParserXiaomi.parse_area(header, data)
-            else:
-                _LOGGER.debug("UNKNOWN BLOCK TYPE: %s, header length %s, data length %s", block_type, block_header_length, block_data_length)
-            block_start_position = block_start_position + block_data_length + MapDataParserXiaomi.get_int8(header, 2)
+            elif block_type != MapDataParserXiaomi.IMAGE:
+                _LOGGER.debug("UNKNOWN BLOCK TYPE: %s, header length %s, data length %s", block_type, len(header),
+                              len(data))
 
+        img_start, img_header, img_data = blocks.get(MapDataParserXiaomi.IMAGE, (None, None, None))
         if img_data:
-            image, rooms = MapDataParserXiaomi.parse_image(img_data_length, img_header_length, img_data, img_header, map_data.carpet_map,
-                                                           colors, image_config)
+            image, rooms = MapDataParserXiaomi.parse_image(len(img_data), len(img_header), img_data, img_header,
+                                                           map_data.carpet_map, colors, image_config)
             map_data.image = image
             map_data.rooms = rooms
 
@@ -128,36 +108,81 @@ class MapDataParserXiaomi(MapDataParser):
             ImageHandlerXiaomi.draw_texts(map_data.image, texts)
         return map_data
 
+    @staticmethod
+    def index_blocks(raw: memoryview) -> Dict[int, Tuple[int, memoryview, memoryview]]:
+        """Returns start position, header and data of each block, without decoding or copying them."""
+        blocks = {}
+        block_start_position = unpack_from("<H", raw, 0x02)[0]
+        while block_start_position < len(raw):
+            block_type, block_header_length, block_data_length = \
+                MapDataParserXiaomi.BLOCK_HEADER.unpack_from(raw, block_start_position)
+            block_data_start = block_start_position + block_header_length
+            blocks[block_type] = (block_start_position,
+                                  raw[block_start_position: block_data_start],
+                                  raw[block_data_start: block_data_start + block_data_length])
+            block_start_position = block_data_start + block_data_length
+        return blocks
+
+    @staticmethod
+    def decode_block(block_type: int, header: memoryview, data: memoryview, map_data: MapData) -> Any:
+        if block_type in [MapDataParserXiaomi.CHARGER, MapDataParserXiaomi.ROBOT_POSITION]:
+            return MapDataParserXiaomi.parse_object_position(len(data), data)
+        if block_type in [MapDataParserXiaomi.PATH, MapDataParserXiaomi.GOTO_PATH,
+                          MapDataParserXiaomi.GOTO_PREDICTED_PATH]:
+            return MapDataParserXiaomi.parse_path(header, data)
+        if block_type == MapDataParserXiaomi.CURRENTLY_CLEANED_ZONES:
+            return MapDataParserXiaomi.parse_zones(data, header)
+        if block_type == MapDataParserXiaomi.GOTO_TARGET:
+            return MapDataParserXiaomi.parse_goto_target(data)
+        if block_type == MapDataParserXiaomi.VIRTUAL_WALLS:
+            return MapDataParserXiaomi.parse_walls(data, header)
+        if block_type in [MapDataParserXiaomi.NO_GO_AREAS, MapDataParserXiaomi.NO_MOPPING_AREAS,
+                          MapDataParserXiaomi.NO_CARPET_AREAS]:
+            return MapDataParserXiaomi.parse_area(header, data)
+        if block_type in [MapDataParserXiaomi.OBSTACLES, MapDataParserXiaomi.IGNORED_OBSTACLES,
+                          MapDataParserXiaomi.OBSTACLES_WITH_PHOTO, MapDataParserXiaomi.IGNORED_OBSTACLES_WITH_PHOTO]:
+            return MapDataParserXiaomi.parse_obstacles(data, header)
+        if block_type == MapDataParserXiaomi.BLOCKS:
+            block_pairs = MapDataParserXiaomi.get_pairs(header)
+            return bytes(data[:block_pairs])
+        if block_type == MapDataParserXiaomi.MOP_PATH:
+            # only the map_data.path points where points_mask == 1 are in mop_path
+            return MapDataParserXiaomi.parse_mop_path(map_data.path, data)
+        if block_type == MapDataParserXiaomi.CARPET_MAP:
+            # only the indexes where value == 1 are in carpet_map
+            return MapDataParserXiaomi.parse_carpet_map(data)
+        return None
+
     @staticmethod
     def map_to_image(p: Point) -> Point:
         return Point(p.x / MM, p.y / MM)
 
+    @staticmethod
+    def map_to_image_array(xy: np.ndarray) -> np.ndarray:
+        return xy / MM
+
     @staticmethod
     def image_to_map(x: float) -> float:
         return x * MM
 
     @staticmethod
     def get_current_vacuum_room(block_start_position: int, raw: bytes, vacuum_position: Point) -> int:
-        block_header_length = MapDataParserXiaomi.get_int16(raw, block_start_position + 0x02)
-        header = MapDataParserXiaomi.get_bytes(raw, block_start_position, block_header_length)
-        block_data_length = MapDataParserXiaomi.get_int32(header, 0x04)
+        _, block_header_length, block_data_length = \
+            MapDataParserXiaomi.BLOCK_HEADER.unpack_from(raw, block_start_position)
         block_data_start = block_start_position + block_header_length
-        data = MapDataParserXiaomi.get_bytes(raw, block_data_start, block_data_length)
-        image_top = MapDataParserXiaomi.get_int32(header, block_header_length - 16)
-        image_left = MapDataParserXiaomi.get_int32(header, block_header_length - 12)
-        image_width = MapDataParserXiaomi.get_int32(header, block_header_length - 4)
+        data = memoryview(raw)[block_data_start: block_data_start + block_data_length]
+        image_top, image_left, _, image_width = \
+            MapDataParserXiaomi.IMAGE_BOUNDS.unpack_from(raw, block_data_start - MapDataParserXiaomi.IMAGE_BOUNDS.size)
         p = MapDataParserXiaomi.map_to_image(vacuum_position)
         room = ImageHandlerXiaomi.get_room_at_pixel(data, image_width, round(p.x - image_left), round(p.y - image_top))
         return room
 
     @staticmethod
-    def parse_image(block_data_length: int, block_header_length: int, data: bytes, header: bytes, carpet_map: Set[int],
+    def parse_image(block_data_length: int, block_header_length: int, data: bytes, header: bytes, carpet_map: Optional[CarpetMap],
                     colors: Colors, image_config: ImageConfig) -> Tuple[ImageData, Dict[int, Room]]:
         image_size = block_data_length
-        image_top = MapDataParserXiaomi.get_int32(header, block_header_length - 16)
-        image_left = MapDataParserXiaomi.get_int32(header, block_header_length - 12)
-        image_height = MapDataParserXiaomi.get_int32(header, block_header_length - 8)
-        image_width = MapDataParserXiaomi.get_int32(header, block_header_length - 4)
+        image_top, image_left, image_height, image_width = MapDataParserXiaomi.IMAGE_BOUNDS.unpack_from(
+            header, block_header_length - MapDataParserXiaomi.IMAGE_BOUNDS.size)
         if image_width \
                 - image_width * (image_config[CONF_TRIM][CONF_LEFT] + image_config[CONF_TRIM][CONF_RIGHT]) / 100 \
                 < MINIMAL_IMAGE_WIDTH:
@@ -181,149 +206,94 @@ class MapDataParserXiaomi(MapDataParser):
                          image_height,
                          image_width,
                          image_config,
-                         image, MapDataParserXiaomi.map_to_image), rooms
+                         image, MapDataParserXiaomi.map_to_image,
+                         img_transformation_array=MapDataParserXiaomi.map_to_image_array), rooms
 
     @staticmethod
-    def parse_carpet_map(data: bytes, image_config: ImageConfig) -> Set[int]:
-        carpet_map = set()
-
-        for i, v in enumerate(data):
-            if v:
-                carpet_map.add(i)
-        return carpet_map
+    def parse_carpet_map(data: bytes) -> CarpetMap:
+        return CarpetMap(np.frombuffer(data, dtype=np.uint8) != 0)
 
     @staticmethod
     def parse_goto_target(data: bytes) -> Point:
-        x = MapDataParserXiaomi.get_int16(data, 0x00)
-        y = MapDataParserXiaomi.get_int16(data, 0x02)
+        x, y = unpack_from("<HH", data, 0x00)
         return Point(x, y)
 
     @staticmethod
     def parse_object_position(block_data_length: int, data: bytes) -> Point:
-        x = MapDataParserXiaomi.get_int32(data, 0x00)
-        y = MapDataParserXiaomi.get_int32(data, 0x04)
+        x, y = unpack_from("<II", data, 0x00)
         a = None
         if block_data_length > 8:
-            a = MapDataParserXiaomi.get_int32(data, 0x08)
+            a = unpack_from("<I", data, 0x08)[0]
             if a > 0xFF:
                 a = (a & 0xFF) - 256
         return Point(x, y, a)
 
     @staticmethod
     def parse_walls(data: bytes, header: bytes) -> List[Wall]:
-        wall_pairs = MapDataParserXiaomi.get_int16(header, 0x08)
-        walls = []
-        for wall_start in range(0, wall_pairs * 8, 8):
-            x0 = MapDataParserXiaomi.get_int16(data, wall_start + 0)
-            y0 = MapDataParserXiaomi.get_int16(data, wall_start + 2)
-            x1 = MapDataParserXiaomi.get_int16(data, wall_start + 4)
-            y1 = MapDataParserXiaomi.get_int16(data, wall_start + 6)
-            walls.append(Wall(x0, y0, x1, y1))
-        return walls
+        wall_pairs = MapDataParserXiaomi.get_pairs(header)
+        records = data[:wall_pairs * MapDataParserXiaomi.LINE_RECORD.size]
+        return [Wall(*wall) for wall in MapDataParserXiaomi.LINE_RECORD.iter_unpack(records)]
 
     @staticmethod
     def parse_obstacles(data: bytes, header: bytes) -> List[Obstacle]:
-        obstacle_pairs = MapDataParserXiaomi.get_int16(header, 0x08)
+        obstacle_pairs = MapDataParserXiaomi.get_pairs(header)
         obstacles = []
         if obstacle_pairs == 0:
             return obstacles
         obstacle_size = int(len(data) / obstacle_pairs)
         for obstacle_start in range(0, obstacle_pairs * obstacle_size, obstacle_size):
-            x = MapDataParserXiaomi.get_int16(data, obstacle_start + 0)
-            y = MapDataParserXiaomi.get_int16(data, obstacle_start + 2)
+            x, y = unpack_from("<HH", data, obstacle_start)
             details = {}
             if obstacle_size >= 6:
-                details[ATTR_TYPE] = MapDataParserXiaomi.get_int16(data, obstacle_start + 4)
+                details[ATTR_TYPE] = unpack_from("<H", data, obstacle_start + 4)[0]
                 if details[ATTR_TYPE] in MapDataParserXiaomi.KNOWN_OBSTACLE_TYPES:
                     details[ATTR_DESCRIPTION] = MapDataParserXiaomi.KNOWN_OBSTACLE_TYPES[details[ATTR_TYPE]]
                 if obstacle_size >= 10:
-                    u1 = MapDataParserXiaomi.get_int16(data, obstacle_start + 6)
-                    u2 = MapDataParserXiaomi.get_int16(data, obstacle_start + 8)
+                    u1, u2 = unpack_from("<HH", data, obstacle_start + 6)
                     details[ATTR_CONFIDENCE_LEVEL] = 0 if u2 == 0 else u1 * 10.0 / u2
-                    if obstacle_size == 28 and (data[obstacle_start + 12] & 0xFF) > 0:
-                        txt = MapDataParserXiaomi.get_bytes(data, obstacle_start + 12, 16)
+                    if obstacle_size == 28 and data[obstacle_start + 12] > 0:
+                        txt = bytes(data[obstacle_start + 12: obstacle_start + 28])
                         details[ATTR_PHOTO_NAME] = txt.decode('ascii')
             obstacles.append(Obstacle(x, y, details))
         return obstacles
 
     @staticmethod
     def parse_zones(data: bytes, header: bytes) -> List[Zone]:
-        zone_pairs = MapDataParserXiaomi.get_int16(header, 0x08)
-        zones = []
-        for zone_start in range(0, zone_pairs * 8, 8):
-            x0 = MapDataParserXiaomi.get_int16(data, zone_start + 0)
-            y0 = MapDataParserXiaomi.get_int16(data, zone_start + 2)
-            x1 = MapDataParserXiaomi.get_int16(data, zone_start + 4)
-            y1 = MapDataParserXiaomi.get_int16(data, zone_start + 6)
-            zones.append(Zone(x0, y0, x1, y1))
-        return zones
+        zone_pairs = MapDataParserXiaomi.get_pairs(header)
+        records = data[:zone_pairs * MapDataParserXiaomi.LINE_RECORD.size]
+        return [Zone(*zone) for zone in MapDataParserXiaomi.LINE_RECORD.iter_unpack(records)]
 
     @staticmethod
-    def parse_path(block_start_position: int, header: bytes, raw: bytes) -> Path:
-        path_points = []
-        end_pos = MapDataParserXiaomi.get_int32(header, 0x04)
-        point_length = MapDataParserXiaomi.get_int32(header, 0x08)
-        point_size = MapDataParserXiaomi.get_int32(header, 0x0C)
-        angle = MapDataParserXiaomi.get_int32(header, 0x10)
-        start_pos = block_start_position + 0x14
-        for pos in range(start_pos, start_pos + end_pos, 4):
-            x = MapDataParserXiaomi.get_int16(raw, pos)
-            y = MapDataParserXiaomi.get_int16(raw, pos + 2)
-            path_points.append(Point(x, y))
-        return Path(point_length, point_size, angle, [path_points])
+    def parse_path(header: bytes, data: bytes) -> Path:
+        point_length, point_size, angle = unpack_from("<III", header, 0x08)
+        path_points = np.frombuffer(data, dtype="<u2", count=len(data) // 4 * 2)
+        return Path.from_array(point_length, point_size, angle, path_points)
 
     @staticmethod
     def parse_mop_path(path: Path, mask: bytes) -> Path:
-        mop_paths = []
-        points_num = 0
-        for each_path in path.path:
-            mop_path_points = []
-            for i, point in enumerate(each_path):
-                if mask[i]:
-                    mop_path_points.append(point)
-                    if (i + 1) < len(mask) and not mask[i + 1]:
-                        points_num += len(mop_path_points)
-                        mop_paths.append(mop_path_points)
-                        mop_path_points = []
-
-            points_num += len(mop_path_points)
-            mop_paths.append(mop_path_points)
-        return Path(points_num, path.point_size, path.angle, mop_paths)
+        mask = np.frombuffer(mask, dtype=np.uint8) != 0
+        points = []
+        offsets = [np.zeros(1, dtype=np.int64)]
+        for segment in path:
+            # mask is indexed from the beginning of each segment
+            selected = np.zeros(len(segment), dtype=bool)
+            selected[:len(mask)] = mask[:len(segment)]
+            edges = np.flatnonzero(np.diff(selected, prepend=False, append=False))
+            starts, ends = edges[0::2], edges[1::2]
+            # last run is closed only by an unset mask byte right after the segment
+            if len(ends) == 0 or ends[-1] < len(segment) or (len(mask) > len(segment) and not mask[len(segment)]):
+                starts, ends = np.append(starts, len(segment)), np.append(ends, len(segment))
+            points.append(segment[selected])
+            offsets.append(offsets[-1][-1] + np.cumsum(ends - starts))
+        points = np.concatenate(points) if points else np.zeros((0, 2), dtype=path.points.dtype)
+        return Path.from_array(len(points), path.point_size, path.angle, points, np.concatenate(offsets))
 
     @staticmethod
     def parse_area(header: bytes, data: bytes) -> List[Area]:
-        area_pairs = MapDataParserXiaomi.get_int16(header, 0x08)
-        areas = []
-        for area_start in range(0, area_pairs * 16, 16):
-            x0 = MapDataParserXiaomi.get_int16(data, area_start + 0)
-            y0 = MapDataParserXiaomi.get_int16(data, area_start + 2)
-            x1 = MapDataParserXiaomi.get_int16(data, area_start + 4)
-            y1 = MapDataParserXiaomi.get_int16(data, area_start + 6)
-            x2 = MapDataParserXiaomi.get_int16(data, area_start + 8)
-            y2 = MapDataParserXiaomi.get_int16(data, area_start + 10)
-            x3 = MapDataParserXiaomi.get_int16(data, area_start + 12)
-            y3 = MapDataParserXiaomi.get_int16(data, area_start + 14)
-            areas.append(Area(x0, y0, x1, y1, x2, y2, x3, y3))
-        return areas
-
-    @staticmethod
-    def get_bytes(data: bytes, start_index: int, size: int) -> bytes:
-        return data[start_index: start_index + size]
-
-    @staticmethod
-    def get_int8(data: bytes, address: int) -> int:
-        return data[address] & 0xFF
-
-    @staticmethod
-    def get_int16(data: bytes, address: int) -> int:
-        return \
-            ((data[address + 0] << 0) & 0xFF) | \
-            ((data[address + 1] << 8) & 0xFFFF)
+        area_pairs = MapDataParserXiaomi.get_pairs(header)
+        records = data[:area_pairs * MapDataParserXiaomi.AREA_RECORD.size]
+        return [Area(*area) for area in MapDataParserXiaomi.AREA_RECORD.iter_unpack(records)]
 
     @staticmethod
-    def get_int32(data: bytes, address: int) -> int:
-        return \
-            ((data[address + 0] << 0) & 0xFF) | \
-            ((data[address + 1] << 8) & 0xFFFF) | \
-            ((data[address + 2] << 16) & 0xFFFFFF) | \
-            ((data[address + 3] << 24) & 0xFFFFFFFF)
+    def get_pairs(header: bytes) -> int:
+        return unpack_from("<H", header, 0x08)[0]
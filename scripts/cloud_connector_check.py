@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+
+from aiohttp import web
+
+from custom_components.xiaomi_cloud_map_extractor.common.xiaomi_cloud_connector import XiaomiCloudConnector
+from custom_components.xiaomi_cloud_map_extractor.common.xiaomi_cloud_connector_async import \
+    XiaomiCloudConnectorAsync
+from custom_components.xiaomi_cloud_map_extractor.xiaomi.vacuum import XiaomiVacuum
+
+USERNAME = "user@example.com"
+PASSWORD = "password"
+USER_ID = 1234
+TOKEN = "0123456789abcdef0123456789abcdef"
+DEVICE_ID = "987654"
+MODEL = "roborock.vacuum.s5"
+MAP_NAME = "map_slot_0"
+
+
+class FakeXiaomiCloud:
+    """
+    Local server answering like Xiaomi cloud: three-step login, encrypted API calls used for device discovery
+    and map url retrieval, and map file download. Encrypted calls are rejected unless their signatures are valid.
+    """
+
+    def __init__(self):
+        self.ssecurity = base64.b64encode(os.urandom(16)).decode()
+        self.service_token = base64.b64encode(os.urandom(16)).decode()
+        self.sign = hashlib.md5(os.urandom(16)).hexdigest()
+        self.map_file = gzip.compress(os.urandom(4096))
+        self.url = None
+        self.calls = []
+        self._runner = None
+        self._app = web.Application()
+        self._app.router.add_get("/pass/serviceLogin", self.service_login)
+        self._app.router.add_post("/pass/serviceLoginAuth2", self.service_login_auth)
+        self._app.router.add_get("/sts", self.sts)
+        self._app.router.add_post("/app/home/device_list", self.device_list)
+        self._app.router.add_post("/app/v2/homeroom/gethome", self.get_home)
+        self._app.router.add_post("/app/v2/home/home_device_list", self.home_device_list)
+        self._app.router.add_post("/app/home/getmapfileurl", self.get_map_file_url)
+        self._app.router.add_get(f"/maps/{MAP_NAME}", self.map)
+
+    async def start(self):
+        self._runner = web.AppRunner(self._app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def service_login(self, request: web.Request) -> web.Response:
+        self.calls.append("serviceLogin")
+        if request.cookies.get("userId") != USERNAME:
+            return web.Response(text="&&&START&&&" + json.dumps({"code": 70016}))
+        return web.Response(text="&&&START&&&" + json.dumps({"_sign": self.sign}))
+
+    async def service_login_auth(self, request: web.Request) -> web.Response:
+        self.calls.append("serviceLoginAuth2")
+        password_hash = hashlib.md5(PASSWORD.encode()).hexdigest().upper()
+        if request.query.get("_sign") != self.sign or request.query.get("user") != USERNAME or \
+                request.query.get("hash") != password_hash:
+            return web.Response(text="&&&START&&&" + json.dumps({"code": 70016}))
+        return web.Response(text="&&&START&&&" + json.dumps({
+            "ssecurity": self.ssecurity,
+            "userId": USER_ID,
+            "cUserId": "cUserId",
+            "passToken": "passToken",
+            "location": f"{self.url}/sts",
+            "code": 0
+        }))
+
+    async def sts(self, request: web.Request) -> web.Response:
+        self.calls.append("sts")
+        response = web.Response(text="ok")
+        response.set_cookie("serviceToken", self.service_token)
+        return response
+
+    async def device_list(self, request: web.Request) -> web.Response:
+        return self.__encrypted_response__(request, lambda params: {"result": {"list": [
+            {"token": TOKEN, "uid": USER_ID, "did": DEVICE_ID, "model": MODEL, "mac": "00:11:22:33:44:55"}
+        ]}})
+
+    async def get_home(self, request: web.Request) -> web.Response:
+        return self.__encrypted_response__(request, lambda params: {"result": {
+            "homelist": [{"id": "1", "uid": USER_ID}],
+            "share_home_list": None
+        }})
+
+    async def home_device_list(self, request: web.Request) -> web.Response:
+        return self.__encrypted_response__(request, lambda params: {"result": {"device_info": [
+            {"did": DEVICE_ID, "name": "Vacuum", "model": MODEL, "token": TOKEN, "mac": "00:11:22:33:44:55"}
+        ]}})
+
+    async def get_map_file_url(self, request: web.Request) -> web.Response:
+        def get_url(params):
+            map_name = json.loads(params["data"])["obj_name"]
+            return {"result": {"url": f"{self.url}/maps/{map_name}"}}
+
+        return self.__encrypted_response__(request, get_url)
+
+    async def map(self, request: web.Request) -> web.Response:
+        self.calls.append("map")
+        return web.Response(body=self.map_file)
+
+    def __encrypted_response__(self, request: web.Request, handler) -> web.Response:
+        name = request.path.rsplit("/", 1)[-1]
+        self.calls.append(name)
+        if request.cookies.get("serviceToken") != self.service_token:
+            return web.Response(status=401, text="auth err")
+        fields = dict(request.query)
+        nonce = fields.pop("_nonce")
+        signature = fields.pop("signature")
+        fields.pop("ssecurity")
+        signed_nonce = base64.b64encode(
+            hashlib.sha256(base64.b64decode(self.ssecurity) + base64.b64decode(nonce)).digest()).decode()
+        if XiaomiCloudConnector.generate_enc_signature(request.path, "POST", signed_nonce, fields) != signature:
+            return web.Response(status=400, text="invalid signature")
+        params = {k: XiaomiCloudConnector.decrypt_rc4(signed_nonce, v).decode() for k, v in fields.items()}
+        rc4_hash = params.pop("rc4_hash__")
+        if XiaomiCloudConnector.generate_enc_signature(request.path, "POST", signed_nonce, params) != rc4_hash:
+            return web.Response(status=400, text="invalid rc4 hash")
+        return web.Response(text=XiaomiCloudConnector.encrypt_rc4(signed_nonce, json.dumps(handler(params))))
+
+
+async def run_checks(server: FakeXiaomiCloud) -> bool:
+    results = []
+
+    def check(name: str, passed: bool):
+        print(f"  {'OK  ' if passed else 'FAIL'} {name}")
+        results.append(passed)
+
+    connector = XiaomiCloudConnectorAsync(USERNAME, PASSWORD, account_url=server.url, api_url=f"{server.url}/app")
+    try:
+        check("login", await connector.async_login() is True)
+        check("login calls", server.calls == ["serviceLogin", "serviceLoginAuth2", "sts"])
+
+        devices = await connector.async_get_devices("de")
+        check("encrypted api call", devices is not None and devices["result"]["list"][0]["token"] == TOKEN)
+
+        details = await connector.async_get_device_details(TOKEN, None)
+        check("device discovery", details == ("cn", USER_ID, DEVICE_ID, MODEL, "00:11:22:33:44:55"))
+        details = await connector.async_get_device_details_from_home(TOKEN, "de")
+        check("device discovery from home", details == ("de", USER_ID, DEVICE_ID, MODEL, "00:11:22:33:44:55"))
+
+        vacuum = XiaomiVacuum(connector, "de", USER_ID, DEVICE_ID, MODEL)
+        check("map download", await vacuum.async_get_raw_map_data(MAP_NAME) == server.map_file)
+
+        session_data = connector.session_data()
+        restored = XiaomiCloudConnectorAsync(USERNAME, PASSWORD, account_url=server.url, api_url=f"{server.url}/app")
+        try:
+            check("restored session", restored.restore_session(session_data) and
+                  await restored.async_get_devices("de") is not None)
+            restored.restore_session({**session_data, "service_token": "expired"})
+            check("rejected session", await restored.async_get_devices("de") is None and restored.auth_failed)
+        finally:
+            await restored.async_close()
+    finally:
+        await connector.async_close()
+    return all(results)
+
+
+async def main() -> bool:
+    server = FakeXiaomiCloud()
+    await server.start()
+    print(f"Fake Xiaomi cloud listening on {server.url}")
+    try:
+        return await run_checks(server)
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description="Checks async cloud connector against a local fake Xiaomi cloud")
+    args_parser.parse_args()
+    all_passed = asyncio.run(main())
+    print("All checks passed" if all_passed else "Some checks failed")
+    exit(0 if all_passed else 1)
@@ -67,6 +67,10 @@ def attributes_to_dict(attributes):
     return attributes
 
 
+def decode_map(vacuum_class, map_file, colors, drawables, texts, sizes, transform):
+    return vacuum_class.parse_map(vacuum_class.unpack_map(map_file), colors, drawables, texts, sizes, transform)
+
+
 def parse_map_file(map_config, map_filename, api, suffix=""):
     print(f"Parsing map file \"{map_filename}\" with api \"{api}\"")
     map_file = open(map_filename, "rb").read()
@@ -84,13 +88,13 @@ def parse_map_file(map_config, map_filename, api, suffix=""):
     map_data = None
     try:
         if api == CONF_AVAILABLE_API_XIAOMI:
-            map_data = XiaomiVacuum.decode_map(None, map_file, colors, drawables, texts, sizes, transform)
+            map_data = decode_map(XiaomiVacuum, map_file, colors, drawables, texts, sizes, transform)
         elif api == CONF_AVAILABLE_API_VIOMI:
-            map_data = ViomiVacuum.decode_map(None, map_file, colors, drawables, texts, sizes, transform)
+            map_data = decode_map(ViomiVacuum, map_file, colors, drawables, texts, sizes, transform)
         elif api == CONF_AVAILABLE_API_ROIDMI:
-            map_data = RoidmiVacuum.decode_map(None, map_file, colors, drawables, texts, sizes, transform)
+            map_data = decode_map(RoidmiVacuum, map_file, colors, drawables, texts, sizes, transform)
         elif api == CONF_AVAILABLE_API_DREAME:
-            map_data = DreameVacuum.decode_map(None, map_file, colors, drawables, texts, sizes, transform)
+            map_data = decode_map(DreameVacuum, map_file, colors, drawables, texts, sizes, transform)
     except Exception as e:
         print(f"Failed to parse map data! {e}")
     if map_data is not None:
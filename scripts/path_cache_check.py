@@ -0,0 +1,85 @@
+import argparse
+import copy
+
+import numpy as np
+
+from custom_components.xiaomi_cloud_map_extractor.common.map_data import MapData, Path
+from custom_components.xiaomi_cloud_map_extractor.common.map_data_parser import MapDataParser
+from custom_components.xiaomi_cloud_map_extractor.common.render_cache import RenderCache
+from custom_components.xiaomi_cloud_map_extractor.const import *
+from custom_components.xiaomi_cloud_map_extractor.dreame.vacuum import DreameVacuum
+from custom_components.xiaomi_cloud_map_extractor.roidmi.vacuum import RoidmiVacuum
+from custom_components.xiaomi_cloud_map_extractor.viomi.vacuum import ViomiVacuum
+from custom_components.xiaomi_cloud_map_extractor.xiaomi.vacuum import XiaomiVacuum
+
+VACUUMS = {
+    CONF_AVAILABLE_API_XIAOMI: XiaomiVacuum,
+    CONF_AVAILABLE_API_VIOMI: ViomiVacuum,
+    CONF_AVAILABLE_API_ROIDMI: RoidmiVacuum,
+    CONF_AVAILABLE_API_DREAME: DreameVacuum
+}
+
+
+def get_path_prefix(path: Path, length: int) -> Path:
+    offsets = path.segment_offsets[path.segment_offsets < length]
+    return Path.from_array(path.point_length, path.point_size, path.angle, path.points[:length],
+                           np.append(offsets, length))
+
+
+def render_path(map_data: MapData, drawable: str, path: Path, sequence: int, colors, sizes, scale):
+    rendered = copy.copy(map_data)
+    rendered.image = copy.copy(map_data.image)
+    rendered.image.data = map_data.image.data.copy()
+    rendered.map_sequence = sequence
+    if drawable == DRAWABLE_PATH:
+        rendered.path = path
+    else:
+        rendered.mop_path = path
+    MapDataParser.draw_elements(colors, [drawable], sizes, rendered, {CONF_SCALE: scale})
+    return np.asarray(rendered.image.data.convert("RGBA"), dtype=np.int16)
+
+
+def check_path(map_data: MapData, drawable: str, path: Path, polls: int, colors, sizes, scale) -> bool:
+    """Draws growing path incrementally like consecutive updates do and compares it with drawing it at once."""
+    print(f"Checking {drawable} with {len(path.points)} points in {polls} updates at scale {scale}")
+    cache = MapDataParser.path_cache
+    cache.clear()
+    matches = True
+    for poll in range(1, polls + 1):
+        prefix = get_path_prefix(path, len(path.points) * poll // polls)
+        incremental = render_path(map_data, drawable, prefix, poll, colors, sizes, scale)
+        MapDataParser.path_cache = RenderCache()
+        full = render_path(map_data, drawable, prefix, poll, colors, sizes, scale)
+        MapDataParser.path_cache = cache
+        diff = np.abs(incremental - full)
+        count = int(np.count_nonzero(diff.max(axis=2)))
+        print(f"  update {poll}: {len(prefix.points)} points, {count} pixels differ (max channel diff {diff.max()})")
+        matches = matches and count == 0
+    return matches
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description="Checks that incrementally drawn paths match full redraw")
+    args_parser.add_argument("--map-file", type=str, required=True, help="raw map file")
+    args_parser.add_argument("--api", type=str, choices=list(VACUUMS.keys()), required=True, help="used api")
+    args_parser.add_argument("--scale", type=float, nargs="+", default=[1, 2.5], help="image scales")
+    args_parser.add_argument("--polls", type=int, default=4, help="number of map updates")
+    args_parser.add_argument("--width", type=float, default=6, help="path width")
+    args_parser.add_argument("--color", type=int, nargs="+", default=[147, 194, 238, 120], help="path color")
+    args = args_parser.parse_args()
+
+    vacuum = VACUUMS[args.api]
+    raw_map = vacuum.unpack_map(open(args.map_file, "rb").read())
+    path_colors = {COLOR_PATH: tuple(args.color), COLOR_MOP_PATH: tuple(args.color)}
+    path_sizes = {CONF_SIZE_PATH_WIDTH: args.width, CONF_SIZE_MOP_PATH_WIDTH: args.width}
+    all_match = True
+    for image_scale in args.scale:
+        image_config = {CONF_SCALE: image_scale, CONF_ROTATE: 0,
+                        CONF_TRIM: {CONF_LEFT: 0, CONF_RIGHT: 0, CONF_TOP: 0, CONF_BOTTOM: 0}}
+        parsed = vacuum.parse_map(raw_map, path_colors, [], [], path_sizes, image_config)
+        for name, vacuum_path in [(DRAWABLE_PATH, parsed.path), (DRAWABLE_MOP_PATH, parsed.mop_path)]:
+            if vacuum_path is not None and len(vacuum_path.points) > 1:
+                all_match = check_path(parsed, name, vacuum_path, args.polls, path_colors, path_sizes,
+                                       image_scale) and all_match
+    print("Incremental drawing matches full redraw" if all_match else "Incremental drawing differs from full redraw")
+    exit(0 if all_match else 1)
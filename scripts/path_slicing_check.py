@@ -0,0 +1,42 @@
+import argparse
+import itertools
+
+from custom_components.xiaomi_cloud_map_extractor.common.map_data import Path, Point
+
+
+def to_lists(path: Path):
+    return [[(p.x, p.y) for p in segment] for segment in path.path]
+
+
+def check_slices(segments) -> bool:
+    """Compares every slice of a path with the same slice of its segments stored as lists of points."""
+    path = Path(len(segments), 1, 0, segments)
+    expected_path = [[(p.x, p.y) for p in segment] for segment in segments]
+    bounds = [None] + list(range(-len(segments) - 2, len(segments) + 3))
+    all_match = True
+    for start, stop in itertools.product(bounds, bounds):
+        sliced = path[start:stop]
+        expected = expected_path[start:stop]
+        matches = len(sliced) == len(expected) and to_lists(sliced) == expected and \
+            len(sliced.as_dict()["path"]) == len(expected)
+        if not matches:
+            print(f"  [{start}:{stop}] gives {to_lists(sliced)} instead of {expected}")
+        all_match = all_match and matches
+    return all_match
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description="Checks that paths are sliced like lists of segments")
+    args_parser.parse_args()
+    paths = [
+        [],
+        [[Point(0, 0), Point(1, 1)]],
+        [[Point(0, 0), Point(1, 1)], [Point(2, 2), Point(3, 3), Point(4, 4)]],
+        [[Point(0, 0)], [], [Point(1, 1), Point(2, 2)], [Point(3, 3)]]
+    ]
+    all_passed = True
+    for test_path in paths:
+        print(f"Checking slices of path with {len(test_path)} segments")
+        all_passed = check_slices(test_path) and all_passed
+    print("All slices match" if all_passed else "Some slices differ")
+    exit(0 if all_passed else 1)